@@ -4,17 +4,30 @@ import os
 import pandas as pd
 import sqlite3
 import json
+import csv
 import re
 import uuid
+import hashlib
+import zlib
+import tempfile
+import shutil
+import sys
 from datetime import datetime
-from flask import Flask, request, jsonify, render_template, Response, redirect, url_for
-from PIL import Image
+import click
+from flask import Flask, request, jsonify, render_template, Response, redirect, url_for, send_file, g
+from PIL import Image, ImageDraw, ImageFont
 from fpdf import FPDF
 import io
 import time
-import base64
 import numpy as np
-from collections import defaultdict
+import threading
+import functools
+import contextlib
+import bisect
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from collections import defaultdict, OrderedDict, Counter
 from fpdf.enums import XPos, YPos
 
 # Custom FPDF Class for Branded Header
@@ -35,127 +48,1143 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE = os.path.join(BASE_DIR, 'backtests.db')
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 STOCK_LIST_FILE = os.path.join(BASE_DIR, 'StockList.csv')
+PRICE_STORE_DIR = os.path.join(BASE_DIR, 'cache', 'prices')
+MATCH_CACHE_DB = os.path.join(BASE_DIR, 'cache', 'match_cache.db')
+MARKET_TZ = 'Asia/Kolkata'
+DAY_NS = 86_400_000_000_000
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+PIVOT_LEVELS = ('P', 'R1', 'S1', 'R2', 'S2', 'R3', 'S3', 'R4', 'S4', 'R5', 'S5')
+app.config.setdefault('SQLITE_BUSY_TIMEOUT_MS', 10000)
+app.config.setdefault('BAR_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+app.config.setdefault('MIND_WORKERS', os.cpu_count() or 1)
+app.config.setdefault('MIND_CHUNK_SIZE', 16)
+app.config.setdefault('MATCH_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+app.config.setdefault('MATCH_CACHE_MAX_AGE_DAYS', 30)
+app.config.setdefault('JOB_WORKERS', 2)
+app.config.setdefault('JOB_QUEUE_LIMIT', 32)
+app.config.setdefault('JOB_RETENTION', 100)
+app.config.setdefault('PDF_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+app.config.setdefault('SLOW_REQUEST_MS', 2000)
+app.config.setdefault('CATALOG_RECHECK_SECONDS', 10)
+# Zones are coded as lower_level * ZONE_STRIDE + upper_level (indices into PIVOT_LEVELS, ZONE_OPEN when unbounded).
+ZONE_OPEN = len(PIVOT_LEVELS); ZONE_STRIDE = ZONE_OPEN + 1
+NO_PIVOTS_ZONE = ZONE_STRIDE * ZONE_STRIDE; UNKNOWN_ZONE = NO_PIVOTS_ZONE + 1
+# Pattern timeframes. Periods are coded as whole periods since 1970: weeks (Monday to Sunday) count from the week of
+# 1969-12-29, and months, quarters and years from January 1970. OUTCOME_SESSIONS is how many sessions at either end of
+# the outcome period are averaged to find its start and end zones.
+TIMEFRAMES = ('week', 'month', 'quarter', 'year')
+PERIOD_MONTHS = {'month': 1, 'quarter': 3, 'year': 12}
+OUTCOME_SESSIONS = {'week': 1, 'month': 5, 'quarter': 5, 'year': 5}
+# premise_month/outcome_month hold period codes of the pattern's timeframe (month codes for monthly patterns).
+MATCH_DTYPE = np.dtype([('premise_month', np.int32), ('outcome_month', np.int32), ('start_zone', np.int16), ('end_zone', np.int16)])
+
+# INSTRUMENTATION
+# Hot paths time their stages with stage_timer / @timed into the StageTimings collecting on the current thread, if
+# any; with none active a timer costs one attribute lookup. Each request (and background job) collects one. Its stage
+# totals and per-ticker times feed the histograms on /metrics and the slow-request log (SLOW_REQUEST_MS, 0 disables).
+# With ?timings=1 (or "timings": true in the JSON body), analysis endpoints also return them as a "timings" block.
+# Mind workers collect per chunk and send their timings back with the matches.
+METRIC_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+_timings_local = threading.local()
+
+class StageTimings:
+    def __init__(self):
+        self.stages = defaultdict(float); self.tickers = defaultdict(float)
+
+    def merge(self, exported):
+        for stage, seconds in exported['stages'].items(): self.stages[stage] += seconds
+        for ticker, seconds in exported['tickers'].items(): self.tickers[ticker] += seconds
+
+    def export(self):
+        return {'stages': dict(self.stages), 'tickers': dict(self.tickers)}
+
+    def as_block(self, total=None):
+        """Seconds per stage (and per ticker, slowest first), for an API response."""
+        block = {'stages': {stage: round(seconds, 6) for stage, seconds in sorted(self.stages.items(), key=lambda item: -item[1])}}
+        if self.tickers: block['tickers'] = {ticker: round(seconds, 6) for ticker, seconds in sorted(self.tickers.items(), key=lambda item: -item[1])}
+        if total is not None: block['total'] = round(total, 6)
+        return block
+
+def current_timings():
+    return getattr(_timings_local, 'current', None)
+
+class collect_timings:
+    """Context manager that makes a fresh StageTimings current for the enclosed code (restoring the previous one after)."""
+    def __enter__(self):
+        self.previous = current_timings(); _timings_local.current = self.timings = StageTimings()
+        return self.timings
+
+    def __exit__(self, *exc_info):
+        _timings_local.current = self.previous
+
+class stage_timer:
+    """Adds the enclosed block's duration to a stage and/or a ticker of the current StageTimings."""
+    __slots__ = ('stage', 'ticker', 'timings', 'start')
+
+    def __init__(self, stage=None, ticker=None):
+        self.stage = stage; self.ticker = ticker
+
+    def __enter__(self):
+        self.timings = current_timings()
+        if self.timings is not None: self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.timings is None: return
+        elapsed = time.perf_counter() - self.start
+        if self.stage is not None: self.timings.stages[self.stage] += elapsed
+        if self.ticker is not None: self.timings.tickers[self.ticker] += elapsed
+
+def timed(stage):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage): return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+class Histogram:
+    """Minimal Prometheus histogram rendered in the text exposition format."""
+    def __init__(self, name, documentation, label_names=(), buckets=METRIC_BUCKETS):
+        self.name = name; self.documentation = documentation; self.label_names = label_names; self.buckets = buckets
+        self._series = {}; self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None: series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1; series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock: series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for label_values, counts, total in series:
+            labels = ','.join(f'{name}="{_metric_label(value)}"' for name, value in zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count; le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}"); lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+def _metric_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+REQUEST_SECONDS = Histogram('camarilla_request_duration_seconds', 'HTTP request latency.', ('endpoint', 'method', 'status'))
+STAGE_SECONDS = Histogram('camarilla_stage_duration_seconds', 'Time a request or job spent in each pipeline stage.', ('stage',))
+TICKER_SECONDS = Histogram('camarilla_ticker_analysis_seconds', 'Time to analyze one ticker.')
+JOB_SECONDS = Histogram('camarilla_job_duration_seconds', 'Run time of background Camarilla Mind jobs.', ('status',))
+
+def observe_timings(timings):
+    for stage, seconds in timings.stages.items(): STAGE_SECONDS.observe(seconds, stage)
+    for seconds in timings.tickers.values(): TICKER_SECONDS.observe(seconds)
+
+def timings_requested(data=None):
+    return request.args.get('timings', '').lower() in ('1', 'true', 'yes') or bool(isinstance(data, dict) and data.get('timings'))
+
+def timings_block():
+    return g.timings.as_block(total=time.perf_counter() - g.request_started)
+
+@app.before_request
+def start_request_timings():
+    g.previous_timings = current_timings(); g.request_started = time.perf_counter()
+    _timings_local.current = g.timings = StageTimings()
+
+@app.after_request
+def record_request_timings(response):
+    if 'request_started' not in g: return response
+    elapsed = time.perf_counter() - g.request_started
+    REQUEST_SECONDS.observe(elapsed, request.endpoint or 'unmatched', request.method, str(response.status_code))
+    observe_timings(g.timings)
+    threshold = app.config['SLOW_REQUEST_MS']
+    if threshold and elapsed * 1000 >= threshold:
+        stages = ', '.join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in sorted(g.timings.stages.items(), key=lambda item: -item[1]))
+        app.logger.warning(f"Slow request: {request.method} {request.full_path.rstrip('?')} took {elapsed * 1000:.0f}ms ({stages or 'no stages recorded'})")
+    return response
+
+@app.teardown_request
+def end_request_timings(exc):
+    if 'request_started' in g: _timings_local.current = g.previous_timings
+
+@app.route('/metrics')
+def metrics():
+    lines = []
+    for histogram in (REQUEST_SECONDS, STAGE_SECONDS, TICKER_SECONDS, JOB_SECONDS): lines.extend(histogram.render())
+    caches = {'bars': bar_cache.stats(), 'matches': match_cache.stats(), 'reports': report_cache.stats()}
+    for metric, key, kind, documentation in (('camarilla_cache_hits_total', 'hits', 'counter', 'Cache hits.'), ('camarilla_cache_misses_total', 'misses', 'counter', 'Cache misses.'),
+                                             ('camarilla_cache_evictions_total', 'evictions', 'counter', 'Cache evictions.'), ('camarilla_cache_bytes', 'bytes', 'gauge', 'Bytes held by the cache.'),
+                                             ('camarilla_cache_entries', 'entries', 'gauge', 'Entries held by the cache.')):
+        lines += [f"# HELP {metric} {documentation}", f"# TYPE {metric} {kind}"]
+        lines += [f'{metric}{{cache="{name}"}} {stats[key]}' for name, stats in caches.items()]
+    with _jobs_lock: job_statuses = Counter(job.status for job in _jobs.values())
+    lines += ["# HELP camarilla_jobs Background jobs currently tracked, by status.", "# TYPE camarilla_jobs gauge"]
+    lines += [f'camarilla_jobs{{status="{status}"}} {job_statuses.get(status, 0)}' for status in ('queued', 'running', 'done', 'failed', 'cancelled')]
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+# DATABASE CONNECTIONS
+# Each thread keeps one long-lived connection per database file, so sqlite3's per-connection statement
+# cache is reused across requests. Connections run in WAL mode with a busy timeout, letting history reads
+# proceed while a backtest is being saved instead of failing with "database is locked".
+_db_local = threading.local()
+
+def connect_db(path=None):
+    path = path or DATABASE
+    connections = getattr(_db_local, 'connections', None)
+    if connections is None: connections = _db_local.connections = {}
+    db = connections.get(path)
+    if db is None:
+        db = sqlite3.connect(path, timeout=app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000, cached_statements=256)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL"); db.execute(f"PRAGMA busy_timeout = {int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}"); db.execute("PRAGMA synchronous=NORMAL")
+        connections[path] = db
+    return db
 
 def init_db():
+    # One write transaction, so web processes started side by side migrate the database one after another.
     with app.app_context():
-        db = sqlite3.connect(DATABASE); cursor = db.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS backtests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, test_type TEXT NOT NULL,
-                test_name TEXT NOT NULL DEFAULT 'Untitled', pattern TEXT NOT NULL, parameters TEXT, 
-                results TEXT NOT NULL, notes TEXT, share_uuid TEXT UNIQUE
-            )''')
-        cursor.execute("PRAGMA table_info(backtests)")
-        existing_columns = [row[1] for row in cursor.fetchall()]
-        if 'notes' not in existing_columns: cursor.execute("ALTER TABLE backtests ADD COLUMN notes TEXT")
-        if 'share_uuid' not in existing_columns: cursor.execute("ALTER TABLE backtests ADD COLUMN share_uuid TEXT UNIQUE")
-        db.commit(); db.close()
+        db = connect_db(); cursor = db.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try: _migrate_db(db, cursor)
+        except BaseException: db.rollback(); raise
+        db.commit()
+    _initialized_databases.add(DATABASE)
+
+def _migrate_db(db, cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS backtests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, test_type TEXT NOT NULL,
+            test_name TEXT NOT NULL DEFAULT 'Untitled', pattern TEXT NOT NULL, parameters TEXT, 
+            results TEXT NOT NULL, notes TEXT, share_uuid TEXT UNIQUE
+        )''')
+    cursor.execute("PRAGMA table_info(backtests)")
+    existing_columns = [row[1] for row in cursor.fetchall()]
+    if 'notes' not in existing_columns: cursor.execute("ALTER TABLE backtests ADD COLUMN notes TEXT")
+    if 'share_uuid' not in existing_columns: cursor.execute("ALTER TABLE backtests ADD COLUMN share_uuid TEXT")
+    # Summary columns let the history listing avoid loading the results blobs.
+    for column, column_type in (('match_count', 'INTEGER'), ('scope', 'TEXT'), ('pattern_hash', 'TEXT')):
+        if column not in existing_columns: cursor.execute(f"ALTER TABLE backtests ADD COLUMN {column} {column_type}")
+    for row in cursor.execute("SELECT id, test_type, pattern, parameters, results FROM backtests WHERE match_count IS NULL").fetchall():
+        params = json.loads(row[3]) if row[3] else {}
+        match_count, scope = summarize_backtest(row[1], params, decode_results(row[4]))
+        cursor.execute("UPDATE backtests SET match_count = ?, scope = ?, pattern_hash = ? WHERE id = ?", (match_count, scope, pattern_hash(row[2]), row[0]))
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_backtests_timestamp ON backtests (timestamp, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_backtests_pattern_hash ON backtests (pattern_hash, pattern)")
+    share_uuid_indexed = any(db.execute(f"PRAGMA index_info('{index[1]}')").fetchone()[2] == 'share_uuid' for index in db.execute("PRAGMA index_list(backtests)").fetchall() if index[2])
+    if not share_uuid_indexed: cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_backtests_share_uuid ON backtests (share_uuid)")
+    init_history_search(db)
+    init_match_storage(db)
+
+_initialized_databases = set(); _init_db_lock = threading.Lock()
+
+def ensure_db():
+    """Runs init_db once per process for the current DATABASE."""
+    if DATABASE in _initialized_databases: return
+    with _init_db_lock:
+        if DATABASE not in _initialized_databases: init_db()
+
+@app.before_request
+def ensure_db_before_request():
+    ensure_db()
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create or migrate the backtests database."""
+    init_db(); click.echo(f"Initialized {DATABASE}")
+
+def init_history_search(db):
+    # Full-text index over name, notes, pattern and ticker/universe, kept in sync by triggers. Skipped if this SQLite lacks FTS5.
+    if db.execute("SELECT 1 FROM sqlite_master WHERE name = 'backtests_fts'").fetchone(): return
+    try: db.execute("CREATE VIRTUAL TABLE backtests_fts USING fts5(test_name, notes, pattern, scope, content='backtests', content_rowid='id')")
+    except sqlite3.OperationalError: app.logger.warning("SQLite FTS5 is unavailable; history search will fall back to LIKE"); return
+    # Statements run one by one: executescript would commit init_db's transaction part way through.
+    for statement in ('''
+        CREATE TRIGGER IF NOT EXISTS backtests_fts_insert AFTER INSERT ON backtests BEGIN
+            INSERT INTO backtests_fts (rowid, test_name, notes, pattern, scope) VALUES (new.id, new.test_name, new.notes, new.pattern, new.scope);
+        END''', '''
+        CREATE TRIGGER IF NOT EXISTS backtests_fts_delete AFTER DELETE ON backtests BEGIN
+            INSERT INTO backtests_fts (backtests_fts, rowid, test_name, notes, pattern, scope) VALUES ('delete', old.id, old.test_name, old.notes, old.pattern, old.scope);
+        END''', '''
+        CREATE TRIGGER IF NOT EXISTS backtests_fts_update AFTER UPDATE OF test_name, notes, pattern, scope ON backtests BEGIN
+            INSERT INTO backtests_fts (backtests_fts, rowid, test_name, notes, pattern, scope) VALUES ('delete', old.id, old.test_name, old.notes, old.pattern, old.scope);
+            INSERT INTO backtests_fts (rowid, test_name, notes, pattern, scope) VALUES (new.id, new.test_name, new.notes, new.pattern, new.scope);
+        END'''):
+        db.execute(statement)
+    db.execute("INSERT INTO backtests_fts (backtests_fts) VALUES ('rebuild')")
+
+def init_match_storage(db):
+    # Single-test match history lives in backtest_matches as integer month/zone codes (see MATCH_DTYPE), one row
+    # per match, and is only read when a caller asks for it. Results saved before this are compressed and split here.
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS backtest_matches (
+            test_id INTEGER NOT NULL, seq INTEGER NOT NULL, premise_month INTEGER NOT NULL, outcome_month INTEGER NOT NULL,
+            start_zone INTEGER NOT NULL, end_zone INTEGER NOT NULL, PRIMARY KEY (test_id, seq)
+        ) WITHOUT ROWID''')
+    db.execute('''
+        CREATE TRIGGER IF NOT EXISTS backtests_matches_delete AFTER DELETE ON backtests BEGIN
+            DELETE FROM backtest_matches WHERE test_id = old.id;
+        END''')
+    for test_id, stored in db.execute("SELECT id, results FROM backtests WHERE typeof(results) = 'text'").fetchall():
+        results_json = json.loads(stored)
+        matches = history_to_matches(results_json['history']) if isinstance(results_json.get('history'), list) else None
+        if matches is not None: store_matches(db, test_id, matches); results_json['history'] = None
+        db.execute("UPDATE backtests SET results = ? WHERE id = ?", (encode_results(results_json), test_id))
+
+def encode_results(results_json):
+    return zlib.compress(json.dumps(results_json, separators=(',', ':')).encode('utf-8'))
+
+def decode_results(stored):
+    # Rows written before results were compressed hold plain JSON text.
+    return json.loads(zlib.decompress(stored) if isinstance(stored, bytes) else stored)
+
+def match_history(matches, timeframe='month'):
+    premise_dates, outcome_dates = period_label(matches['premise_month'], timeframe), period_label(matches['outcome_month'], timeframe)
+    return [{"premise_date": str(p), "outcome_date": str(o), "state": ", ".join(sorted(outcome_labels(int(s), int(e)), key=lambda x: ('->' in x, x)))}
+            for p, o, s, e in zip(premise_dates, outcome_dates, matches['start_zone'], matches['end_zone'])]
+
+def history_to_matches(history):
+    """Recovers a match array from stored history dicts; returns None if any entry does not round-trip exactly."""
+    zone_codes = {label: code for code, label in reversed(list(enumerate(ZONE_LABELS)))}
+    matches = np.empty(len(history), dtype=MATCH_DTYPE)
+    try:
+        for i, entry in enumerate(history):
+            start_zone = end_zone = UNKNOWN_ZONE
+            for outcome in entry['state'].split(', '):
+                if outcome.startswith('Ends in '): end_zone = zone_codes[outcome[len('Ends in '):]]
+                elif outcome.startswith('Stays in '): start_zone = zone_codes[outcome[len('Stays in '):]]
+                else: start_zone = zone_codes[outcome.split(' -> ')[0]]
+            matches[i] = (month_codes(date_to_day(entry['premise_date'])), month_codes(date_to_day(entry['outcome_date'])), start_zone, end_zone)
+    except (KeyError, ValueError, TypeError): return None
+    return matches if match_history(matches) == history else None
+
+def store_matches(db, test_id, matches):
+    db.executemany("INSERT INTO backtest_matches (test_id, seq, premise_month, outcome_month, start_zone, end_zone) VALUES (?, ?, ?, ?, ?, ?)",
+                   ((test_id, seq, int(m['premise_month']), int(m['outcome_month']), int(m['start_zone']), int(m['end_zone'])) for seq, m in enumerate(matches)))
+
+def load_matches(db, test_id):
+    rows = db.execute("SELECT premise_month, outcome_month, start_zone, end_zone FROM backtest_matches WHERE test_id = ? ORDER BY seq", (test_id,)).fetchall()
+    return np.array([tuple(row) for row in rows], dtype=MATCH_DTYPE)
+
+def load_results(db, test_id, stored, include_matches=False):
+    """Decodes a stored results blob. The per-match history is only loaded (or kept, for legacy rows) when include_matches is set."""
+    results_json = decode_results(stored)
+    if not include_matches: results_json.pop('history', None)
+    elif 'history' in results_json and results_json['history'] is None: results_json['history'] = match_history(load_matches(db, test_id), results_json.get('timeframe', 'month'))
+    return results_json
+
+def summarize_backtest(test_type, params, results_json):
+    match_count = results_json.get('total_matches') or results_json.get('total_historical_matches') or 0
+    scope = params.get('ticker', 'N/A') if test_type == 'Single' else params.get('universe', 'All Tickers')
+    return match_count, scope
+
+def pattern_hash(pattern_text):
+    try: canonical = canonicalize_pattern(parse_advanced_pattern(pattern_text))
+    except ValueError: canonical = ' '.join(pattern_text.lower().split())
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+# PRICE STORE
+# Each data/<ticker>.csv is ingested once into columnar .npy files under cache/prices:
+# <ticker>.days.npy holds int64 local (Asia/Kolkata) epoch days and <ticker>.ohlcv.npy a
+# (5, n) float64 block with one contiguous row per column. <ticker>.meta.json records the
+# source CSV's mtime/size; the store is rebuilt whenever those change.
+def get_data_version(ticker):
+    file_path = os.path.join(DATA_DIR, f"{ticker}.csv")
+    try: st = os.stat(file_path)
+    except OSError: return None
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+def _store_paths(ticker):
+    base = os.path.join(PRICE_STORE_DIR, ticker)
+    return f"{base}.days.npy", f"{base}.ohlcv.npy", f"{base}.meta.json"
+
+def build_price_store(ticker):
+    file_path = os.path.join(DATA_DIR, f"{ticker}.csv")
+    with _store_lock(ticker):
+        version = get_data_version(ticker)
+        if version is None: return None
+        with stage_timer('csv_load'): df = pd.read_csv(file_path, on_bad_lines='skip'); df.columns = [col.lower() for col in df.columns]
+        days, ohlcv = _parse_price_rows(df)
+        order = np.argsort(days, kind='stable'); days = days[order]; ohlcv = ohlcv[:, order]
+        with stage_timer('price_store'): _write_price_store(ticker, version, days, ohlcv)
+        return version
+
+def _parse_price_rows(df):
+    # Returns (local epoch days, (5, n) OHLCV block) for the rows whose datetime parses, in file order.
+    with stage_timer('tz_convert'): local_dt = pd.to_datetime(df['datetime'], utc=True, errors='coerce').dt.tz_convert(MARKET_TZ).dt.tz_localize(None)
+    keep = local_dt.notna().to_numpy()
+    days = (local_dt[keep].to_numpy(dtype='datetime64[ns]').astype(np.int64) // DAY_NS).astype(np.int64)
+    ohlcv = np.empty((len(PRICE_COLUMNS), len(days)), dtype=np.float64)
+    for i, col in enumerate(PRICE_COLUMNS):
+        values = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64) if col in df.columns else np.full(len(df), np.nan)
+        ohlcv[i] = values[keep]
+    return days, ohlcv
+
+def _replace_file(path, write):
+    # Writes through a uniquely named temp file in the same directory, then renames it over path.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh: write(fh)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+
+def _write_price_store(ticker, version, days, ohlcv):
+    os.makedirs(PRICE_STORE_DIR, exist_ok=True)
+    days_path, ohlcv_path, meta_path = _store_paths(ticker)
+    # Write the arrays first and the meta file last so a reader never sees a version whose arrays are missing.
+    for path, arr in ((days_path, days), (ohlcv_path, ohlcv)): _replace_file(path, lambda fh: np.save(fh, arr))
+    meta = {'version': version, 'rows': int(len(days)), 'first_day': int(days[0]) if len(days) else None, 'last_day': int(days[-1]) if len(days) else None}
+    _replace_file(meta_path, lambda fh: fh.write(json.dumps(meta).encode('utf-8')))
+    data_catalog.record(ticker, meta)
+
+# Rebuilds, appends and loads of one ticker's store hold its lock, so threads never write it concurrently or load a
+# days/ohlcv pair from two different versions. (Processes only share the rename-into-place guarantee.)
+_store_locks = defaultdict(threading.RLock)
+_store_locks_guard = threading.Lock()
+
+def _store_lock(ticker):
+    with _store_locks_guard: return _store_locks[ticker]
+
+def _stored_version(ticker):
+    try:
+        with open(_store_paths(ticker)[2]) as fh: return json.load(fh).get('version')
+    except (OSError, ValueError): return None
+
+def load_price_data(ticker):
+    version = get_data_version(ticker)
+    if version is None: return None
+    days_path, ohlcv_path, _ = _store_paths(ticker)
+    with _store_lock(ticker):
+        # Checked under the lock: another thread may have rebuilt the store while this one waited.
+        if _stored_version(ticker) != version: build_price_store(ticker)
+        with stage_timer('price_load'): days = np.load(days_path, mmap_mode='r'); ohlcv = np.load(ohlcv_path, mmap_mode='r')
+    prices = {col: ohlcv[i] for i, col in enumerate(PRICE_COLUMNS)}
+    prices['days'] = days; prices['version'] = version
+    return prices
+
+def append_price_rows(ticker, df):
+    """Appends new daily rows to data/<ticker>.csv and extends the price store with them instead of re-reading the CSV.
+
+    df holds the new rows with datetime/open/high/low/close[/volume] columns. Rows may not be older than the last stored
+    day, so the store ends up exactly as a full rebuild from the CSV would leave it. Returns (previous, new) prices.
+    """
+    df = df.copy(); df.columns = [str(col).lower() for col in df.columns]
+    if df.empty: raise ValueError("No bars to append.")
+    if 'datetime' not in df.columns: raise ValueError("New bars need a datetime column.")
+    file_path = os.path.join(DATA_DIR, f"{ticker}.csv")
+    with _store_lock(ticker):
+        prices = load_price_data(ticker)
+        if prices is None: raise ValueError(f"No data file for ticker '{ticker}'.")
+        utc_dt = pd.to_datetime(df['datetime'], utc=True, errors='coerce')
+        if utc_dt.isna().any(): raise ValueError(f"Could not parse the datetime of {int(utc_dt.isna().sum())} new bar(s).")
+        # Written the way the data files store them ("2025-08-12 00:00:00+05:30").
+        df['datetime'] = [ts.floor('s').isoformat(sep=' ') for ts in utc_dt.dt.tz_convert(MARKET_TZ)]
+        # A full rebuild parses the whole datetime column in the format of its first row, so the new rows must match it.
+        with open(file_path, newline='') as fh: reader = csv.reader(fh); columns = [col.lower() for col in next(reader, [])]; first_row = next(reader, None)
+        if 'datetime' not in columns: raise ValueError(f"{ticker}.csv has no datetime column.")
+        if first_row and pd.to_datetime(pd.Series([first_row[columns.index('datetime')], df['datetime'].iloc[0]]), utc=True, errors='coerce').isna().any():
+            raise ValueError(f"{ticker}.csv stores its datetimes in another format; add the rows to the CSV and run `flask --app app ingest` instead.")
+        new_days, new_ohlcv = _parse_price_rows(df)
+        if len(np.unique(new_days)) < len(new_days): raise ValueError("New bars must not contain the same date twice.")
+        if len(prices['days']) and new_days.min() <= prices['days'][-1]:
+            raise ValueError(f"New bars must be dated after the last stored date, {np.datetime64(int(prices['days'][-1]), 'D')}.")
+        with open(file_path, 'rb') as fh:
+            needs_newline = fh.seek(0, os.SEEK_END) > 0 and fh.seek(-1, os.SEEK_END) >= 0 and fh.read(1) != b'\n'
+        with open(file_path, 'a', newline='') as fh:
+            if needs_newline: fh.write('\n')
+            df.reindex(columns=columns).to_csv(fh, header=False, index=False)
+        order = np.argsort(new_days, kind='stable')
+        days = np.concatenate((prices['days'], new_days[order])); ohlcv = np.concatenate((np.stack([prices[col] for col in PRICE_COLUMNS]), new_ohlcv[:, order]), axis=1)
+        with stage_timer('price_store'): _write_price_store(ticker, get_data_version(ticker), days, ohlcv)
+        return prices, load_price_data(ticker)
+
+def date_to_day(date_value, round_up=False):
+    ns = pd.Timestamp(date_value).value
+    return -((-ns) // DAY_NS) if round_up else ns // DAY_NS
+
+@app.cli.command('ingest')
+@click.option('--force', is_flag=True, help='Rebuild every ticker even if its CSV is unchanged.')
+def ingest_command(force):
+    """Convert data/*.csv into the columnar price store."""
+    for f in sorted(os.listdir(DATA_DIR)):
+        if not f.endswith('.csv'): continue
+        ticker = f.replace('.csv', '')
+        if force: build_price_store(ticker)
+        else: load_price_data(ticker)
+        click.echo(f"Ingested {ticker}")
+
+@app.cli.command('append')
+@click.argument('files', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--ticker', help='Ticker the rows belong to (default: each file name without .csv).')
+def append_command(files, ticker):
+    """Append new daily bars from CSV files laid out like data/*.csv, without rebuilding the price store."""
+    ensure_db()
+    for path in files:
+        name = ticker or os.path.splitext(os.path.basename(path))[0]
+        try: summary = append_daily_bars(name, pd.read_csv(path, on_bad_lines='skip'))
+        except ValueError as e: raise click.ClickException(f"{name}: {e}")
+        click.echo(f"Appended {summary['rows_added']} rows to {name} (last date {summary['last_date']}, {len(summary['setups'])} live setups)")
+
+# DATA CATALOG
+# One in-memory entry per data/*.csv with its data version, row count, first and last date (from the price store meta)
+# and universe memberships from StockList.csv. Ticker lists and universes are served from it, and Mind runs use it to
+# skip tickers without a data file or without rows in the requested range before touching their files. The directory
+# and StockList.csv are re-read when their modification times change, and every file is re-checked at most every
+# CATALOG_RECHECK_SECONDS (CSVs edited in place keep the directory's mtime); price store writes update entries at once.
+# A ticker whose store has not been built at its current version has no dates yet and is never skipped; its store meta is
+# read again on each re-check until it has them.
+class DataCatalog:
+    def __init__(self):
+        self._lock = threading.Lock(); self._entries = {}; self._universes = {}
+        self._data_key = None; self._list_key = None; self._checked = 0.0
+
+    @staticmethod
+    def _stat_key(path):
+        try: st = os.stat(path)
+        except OSError: return path, None
+        return path, st.st_mtime_ns, st.st_size
+
+    def _refresh(self):
+        data_key, list_key = self._stat_key(DATA_DIR), self._stat_key(STOCK_LIST_FILE)
+        with self._lock:
+            if data_key != self._data_key or time.monotonic() - self._checked > app.config['CATALOG_RECHECK_SECONDS']:
+                entries = {}
+                with (os.scandir(DATA_DIR) if data_key[1] is not None else contextlib.nullcontext(())) as files:
+                    stats = [(f.name[:-4], f.stat()) for f in files if f.name.endswith('.csv')]
+                for ticker, st in stats:
+                    version = f"{st.st_mtime_ns}-{st.st_size}"
+                    entry = self._entries.get(ticker)
+                    # Entries without dates are re-read too: Mind workers build stores in their own processes, whose catalog writes never reach this one.
+                    fresh = entry is not None and entry['version'] == version and entry['first_day'] is not None
+                    entries[ticker] = entry if fresh else self._load_entry(ticker, version)
+                self._entries = entries; self._data_key = data_key; self._checked = time.monotonic()
+            if list_key != self._list_key:
+                self._universes = {}
+                if list_key[1] is not None:
+                    stock_df = pd.read_csv(STOCK_LIST_FILE, on_bad_lines='skip'); stock_df.columns = [col.strip() for col in stock_df.columns]
+                    for type_name, group in stock_df.groupby('Type'): self._universes.setdefault(type_name.strip(), []).extend(group['Symbol'].str.strip().tolist())
+                self._list_key = list_key
+
+    @staticmethod
+    def _load_entry(ticker, version):
+        entry = {'version': version, 'rows': None, 'first_day': None, 'last_day': None}
+        try:
+            with open(_store_paths(ticker)[2]) as fh: meta = json.load(fh)
+        except (OSError, ValueError): return entry
+        if meta.get('version') != version: return entry
+        if 'first_day' not in meta:
+            # Stores written before the catalog existed only record their row count.
+            try: days = np.load(_store_paths(ticker)[0], mmap_mode='r')
+            except (OSError, ValueError): return entry
+            meta.update(first_day=int(days[0]) if len(days) else None, last_day=int(days[-1]) if len(days) else None)
+        return {**entry, **{k: meta[k] for k in ('rows', 'first_day', 'last_day')}}
+
+    def record(self, ticker, meta):
+        """Updates a ticker's entry from freshly written price store meta."""
+        with self._lock:
+            if ticker in self._entries: self._entries[ticker] = {k: meta[k] for k in ('version', 'rows', 'first_day', 'last_day')}
+
+    def tickers(self):
+        self._refresh()
+        with self._lock: return sorted(self._entries)
+
+    def universes(self):
+        self._refresh()
+        with self._lock: return dict(self._universes)
+
+    def entries(self):
+        """Catalog rows for every ticker with a data file, with ISO dates and universe memberships."""
+        self._refresh()
+        with self._lock: entries = dict(self._entries); universes = dict(self._universes)
+        memberships = defaultdict(list)
+        for universe, symbols in universes.items():
+            for symbol in symbols: memberships[symbol].append(universe)
+        day = lambda value: str(np.datetime64(value, 'D')) if value is not None else None
+        return [{'ticker': ticker, 'first_date': day(e['first_day']), 'last_date': day(e['last_day']), 'rows': e['rows'], 'version': e['version'],
+                 'universes': memberships.get(ticker, [])} for ticker, e in sorted(entries.items())]
+
+    def covering(self, tickers, start_date, end_date):
+        """The subset of tickers (in order) that have a data file and may have rows between start_date and end_date."""
+        self._refresh()
+        first, last = date_to_day(start_date, round_up=True), date_to_day(end_date)
+        with self._lock: entries = self._entries
+        return [t for t in tickers if t in entries and (entries[t]['first_day'] is None or (entries[t]['first_day'] <= last and entries[t]['last_day'] >= first))]
+
+data_catalog = DataCatalog()
+
+@app.route('/api/catalog')
+def get_catalog():
+    try: return jsonify(data_catalog.entries())
+    except Exception as e: app.logger.error(f"Error reading data catalog: {e}"); return jsonify({"error": str(e)}), 500
+
+# BAR CACHE
+# Full-history OHLC bars for each timeframe, with the Camarilla pivots derived from the previous period and the
+# start/end zones of the following period (the outcome if the bar were a premise), per ticker and data version.
+# The timeframes a request needs are built together: period codes are computed once from the daily dates, weekly and
+# monthly bars are reduced from the daily rows, and quarterly and yearly bars from the monthly ones. A date range
+# becomes a slice of these arrays; only a partially covered first/last period is re-aggregated from the daily rows,
+# and only the outcomes that depend on the range's edges are classified again.
+def _first_valid(values, starts, ends):
+    idx = np.where(np.isnan(values), len(values), np.arange(len(values)))
+    first = np.minimum.reduceat(idx, starts)
+    return np.where(first < ends, values[np.minimum(first, len(values) - 1)], np.nan)
+
+def _last_valid(values, starts, ends):
+    idx = np.where(np.isnan(values), -1, np.arange(len(values)))
+    last = np.maximum.reduceat(idx, starts)
+    return np.where(last >= starts, values[np.maximum(last, 0)], np.nan)
+
+def aggregate_bars(prices, starts, ends):
+    # starts/ends must tile the rows contiguously: reduceat reduces each start up to the next one.
+    starts = np.asarray(starts, dtype=np.int64); ends = np.asarray(ends, dtype=np.int64)
+    opens = np.asarray(prices['open']); highs = np.asarray(prices['high']); lows = np.asarray(prices['low']); closes = np.asarray(prices['close'])
+    return {'open': _first_valid(opens, starts, ends), 'high': np.fmax.reduceat(highs, starts), 'low': np.fmin.reduceat(lows, starts), 'close': _last_valid(closes, starts, ends)}
+
+def month_codes(days):
+    return np.asarray(days).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+def period_codes(days, timeframe):
+    if timeframe == 'week': return (np.asarray(days, dtype=np.int64) + 3) // 7
+    return month_codes(days) // PERIOD_MONTHS[timeframe]
+
+def period_start_days(codes, timeframe):
+    codes = np.asarray(codes, dtype=np.int64)
+    if timeframe == 'week': return codes * 7 - 3
+    return (codes * PERIOD_MONTHS[timeframe]).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+
+def period_label(codes, timeframe='month'):
+    return np.datetime_as_string(period_start_days(codes, timeframe).astype('datetime64[D]'))
+
+def _group_bars(source, codes):
+    # One bar per run of equal codes in source (the daily prices or coarser unfiltered bars), with the daily rows it spans.
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(codes)) + 1)); ends = np.append(starts[1:], len(codes))
+    bars = aggregate_bars(source, starts, ends); bars['period'] = codes[starts]
+    if 'row_start' in source: bars['row_start'] = source['row_start'][starts]; bars['row_end'] = source['row_end'][ends - 1]
+    else: bars['row_start'] = starts; bars['row_end'] = ends
+    return bars
+
+def build_period_bars(prices, timeframes=('month',)):
+    """Returns {timeframe: full-history bars} (None when there are no rows) for the requested timeframes."""
+    days = np.asarray(prices['days'])
+    if len(days) == 0: return {timeframe: None for timeframe in timeframes}
+    with stage_timer('resample'):
+        grouped = {}
+        if 'week' in timeframes: grouped['week'] = _group_bars(prices, period_codes(days, 'week'))
+        if any(timeframe in PERIOD_MONTHS for timeframe in timeframes):
+            # Quarters and years are whole months, so they regroup the (unfiltered) monthly bars instead of the days.
+            monthly = _group_bars(prices, month_codes(days))
+            for timeframe, months in PERIOD_MONTHS.items():
+                if timeframe in timeframes: grouped[timeframe] = monthly if months == 1 else _group_bars(monthly, monthly['period'] // months)
+        for timeframe, bars in grouped.items():
+            keep = ~(np.isnan(bars['open']) | np.isnan(bars['high']) | np.isnan(bars['low']) | np.isnan(bars['close']))
+            grouped[timeframe] = {k: v[keep] for k, v in bars.items()}
+    with stage_timer('pivots'):
+        for bars in grouped.values():
+            pivots = calculate_camarilla({k: bars[k][:-1] for k in ('high', 'low', 'close')})
+            for level in PIVOT_LEVELS: bars[f'p_{level}'] = np.concatenate(([np.nan], pivots[level]))
+    with stage_timer('classify'):
+        for timeframe, bars in grouped.items():
+            # The last bar has no following period to classify.
+            start_zone, end_zone = classify_outcomes(prices, bars, np.arange(len(bars['period']) - 1), timeframe)
+            bars['start_zone'] = np.append(start_zone, np.int16(UNKNOWN_ZONE)); bars['end_zone'] = np.append(end_zone, np.int16(UNKNOWN_ZONE))
+    return grouped
+
+def extend_period_bars(bars, prices, old_rows, timeframe):
+    """Brings full-history bars up to date after daily rows were appended after the first old_rows.
+
+    Only the periods from the one holding the first new row onwards are aggregated again (from the daily rows, which
+    gives the same quarters and years as regrouping months), along with their pivots and the outcomes they decide.
+    """
+    days = np.asarray(prices['days'])
+    if bars is None or old_rows == 0: return build_period_bars(prices, (timeframe,))[timeframe]
+    first_period = period_codes(days[old_rows:old_rows + 1], timeframe)[0]
+    j = int(np.searchsorted(bars['period'], first_period, side='left'))
+    tail_start = int(np.searchsorted(days, period_start_days(first_period, timeframe), side='left'))
+    with stage_timer('resample'):
+        tail = _group_bars({k: prices[k][tail_start:] for k in ('open', 'high', 'low', 'close')}, period_codes(days[tail_start:], timeframe))
+        tail['row_start'] = tail['row_start'] + tail_start; tail['row_end'] = tail['row_end'] + tail_start
+        keep = ~(np.isnan(tail['open']) | np.isnan(tail['high']) | np.isnan(tail['low']) | np.isnan(tail['close']))
+        extended = {k: np.concatenate((bars[k][:j], v[keep])) for k, v in tail.items()}
+    n = len(extended['period']); first = max(j, 1)
+    with stage_timer('pivots'):
+        pivots = calculate_camarilla({k: extended[k][first - 1:n - 1] for k in ('high', 'low', 'close')})
+        for level in PIVOT_LEVELS: extended[f'p_{level}'] = np.concatenate((bars[f'p_{level}'][:j] if j else [np.nan], pivots[level]))
+    with stage_timer('classify'):
+        start_zone, end_zone = classify_outcomes(prices, extended, np.arange(first - 1, n - 1), timeframe)
+        extended['start_zone'] = np.concatenate((bars['start_zone'][:first - 1], start_zone, [np.int16(UNKNOWN_ZONE)])).astype(np.int16)
+        extended['end_zone'] = np.concatenate((bars['end_zone'][:first - 1], end_zone, [np.int16(UNKNOWN_ZONE)])).astype(np.int16)
+    return extended
+
+class BarCache:
+    # The budget is read from BAR_CACHE_MAX_BYTES whenever entries are added, so config changes apply without a restart.
+    def __init__(self):
+        self._entries = OrderedDict(); self._lock = threading.Lock()
+        self.current_bytes = 0; self.hits = 0; self.misses = 0; self.evictions = 0
+
+    def get(self, ticker, prices, timeframes=('month',)):
+        """Returns {timeframe: bars}, building every missing timeframe in one build_period_bars call."""
+        key = (ticker, prices['version'])
+        with self._lock:
+            entry = self._entries.get(key)
+            cached = entry[0] if entry is not None else {}
+            missing = [timeframe for timeframe in timeframes if timeframe not in cached]
+            if not missing:
+                self._entries.move_to_end(key); self.hits += 1
+                return {timeframe: cached[timeframe] for timeframe in timeframes}
+            self.misses += 1
+        return self._add(ticker, key, build_period_bars(prices, missing), timeframes)
+
+    def extend(self, ticker, old_version, prices, old_rows):
+        """Moves a ticker's cached bars to the data version in prices after rows were appended (see extend_period_bars)."""
+        with self._lock:
+            entry = self._entries.pop((ticker, old_version), None)
+            if entry is None: return
+            self.current_bytes -= entry[1]
+        extended = {timeframe: extend_period_bars(bars, prices, old_rows, timeframe) for timeframe, bars in entry[0].items()}
+        self._add(ticker, (ticker, prices['version']), extended, tuple(extended))
+
+    def _add(self, ticker, key, built, timeframes):
+        with self._lock:
+            for stale_key in [k for k in self._entries if k[0] == ticker and k != key]:
+                self.current_bytes -= self._entries.pop(stale_key)[1]
+            entry = self._entries.get(key)
+            if entry is None: entry = self._entries[key] = ({}, 0)
+            added = {timeframe: bars for timeframe, bars in built.items() if timeframe not in entry[0]}
+            added_size = sum(arr.nbytes for bars in added.values() if bars is not None for arr in bars.values())
+            entry[0].update(added); self._entries[key] = (entry[0], entry[1] + added_size); self.current_bytes += added_size
+            self._entries.move_to_end(key); result = {timeframe: entry[0][timeframe] for timeframe in timeframes}
+            while self.current_bytes > app.config['BAR_CACHE_MAX_BYTES'] and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size; self.evictions += 1
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.current_bytes, 'max_bytes': app.config['BAR_CACHE_MAX_BYTES'],
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+bar_cache = BarCache()
+
+def get_period_bars(ticker, prices, lo, hi, timeframes=('month',)):
+    """Bars covering daily rows [lo, hi) for each timeframe, or None per timeframe when the ticker has no rows."""
+    full = bar_cache.get(ticker, prices, timeframes)
+    with stage_timer('resample'): return {timeframe: _slice_bars(bars, prices, lo, hi, timeframe) if bars is not None else None for timeframe, bars in full.items()}
+
+def _slice_bars(full, prices, lo, hi, timeframe='month'):
+    m0 = np.searchsorted(full['row_end'], lo, side='right'); m1 = np.searchsorted(full['row_start'], hi, side='left')
+    bars = {k: v[m0:m1].copy() for k, v in full.items()}
+    if len(bars['period']) == 0: return bars
+    # Clip the edge periods to the requested rows and re-aggregate them if they are only partially covered.
+    bars['row_start'][0] = max(bars['row_start'][0], lo); bars['row_end'][-1] = min(bars['row_end'][-1], hi)
+    last = len(bars['period']) - 1
+    partial = [i for i in sorted({0, last}) if bars['row_start'][i] != full['row_start'][m0 + i] or bars['row_end'][i] != full['row_end'][m0 + i]]
+    keep = np.ones(len(bars['period']), dtype=bool)
+    for i in partial:
+        a, b = bars['row_start'][i], bars['row_end'][i]
+        edge_bar = aggregate_bars({k: prices[k][a:b] for k in ('open', 'high', 'low', 'close')}, [0], [b - a])
+        for k, v in edge_bar.items(): bars[k][i] = v[0]
+        keep[i] = not any(np.isnan(v[0]) for v in edge_bar.values())
+    first_clipped, last_clipped = 0 in partial and keep[0], last in partial and keep[last]
+    if partial: bars = {k: v[keep] for k, v in bars.items()}
+    n = len(bars['period'])
+    # Pivots come from the previous period in range: none for the first (so its outcome has no pivot zones), and the
+    # second's change if the first was clipped. Outcomes are classified again only where a clipped edge changes them.
+    if n:
+        for level in PIVOT_LEVELS: bars[f'p_{level}'][0] = np.nan
+        bars['start_zone'][0] = bars['end_zone'][0] = NO_PIVOTS_ZONE
+    if n > 1 and first_clipped:
+        first_pivots = calculate_camarilla({k: bars[k][:1] for k in ('high', 'low', 'close')})
+        for level in PIVOT_LEVELS: bars[f'p_{level}'][1] = first_pivots[level][0]
+    edges = sorted((({1} if first_clipped else set()) | ({n - 2} if last_clipped else set())) & set(range(1, n - 1)))
+    if edges:
+        edges = np.array(edges, dtype=np.int64)
+        bars['start_zone'][edges], bars['end_zone'][edges] = classify_outcomes(prices, bars, edges, timeframe)
+    return bars
+
+@app.route('/api/cache_stats')
+def cache_stats():
+    return jsonify({'bars': bar_cache.stats(), 'matches': match_cache.stats(), 'reports': report_cache.stats()})
 
 # CORE LOGIC FUNCTIONS
 def calculate_camarilla(df):
-    pivots = {}; p = (df['high'] + df['low'] + df['close']) / 3; pivots['P'] = p; range_val = df['high'] - df['low']
-    pivots['R1'] = df['close'] + 1.1 * range_val / 12; pivots['S1'] = df['close'] - 1.1 * range_val / 12; pivots['R2'] = df['close'] + 1.1 * range_val / 6; pivots['S2'] = df['close'] - 1.1 * range_val / 6; pivots['R3'] = df['close'] + 1.1 * range_val / 4; pivots['S3'] = df['close'] - 1.1 * range_val / 4; pivots['R4'] = df['close'] + 1.1 * range_val / 2; pivots['S4'] = df['close'] - 1.1 * range_val / 2; pivots['R5'] = (df['high'] / df['low']) * df['close'] if df['low'] > 0 else df['close']; pivots['S5'] = df['close'] - (pivots['R5'] - df['close'])
-    return pd.Series(pivots)
+    # Vectorized over any mapping of high/low/close arrays (a DataFrame or a dict of columns); returns a dict of levels.
+    high = np.asarray(df['high'], dtype=np.float64); low = np.asarray(df['low'], dtype=np.float64); close = np.asarray(df['close'], dtype=np.float64)
+    pivots = {}; pivots['P'] = (high + low + close) / 3; range_val = high - low
+    pivots['R1'] = close + 1.1 * range_val / 12; pivots['S1'] = close - 1.1 * range_val / 12; pivots['R2'] = close + 1.1 * range_val / 6; pivots['S2'] = close - 1.1 * range_val / 6; pivots['R3'] = close + 1.1 * range_val / 4; pivots['S3'] = close - 1.1 * range_val / 4; pivots['R4'] = close + 1.1 * range_val / 2; pivots['S4'] = close - 1.1 * range_val / 2
+    with np.errstate(divide='ignore', invalid='ignore'): pivots['R5'] = np.where(low > 0, (high / low) * close, close)
+    pivots['S5'] = close - (pivots['R5'] - close)
+    return pivots
 def parse_advanced_pattern(pattern_text):
+    # Clauses are "Week N:", "Month N:", "Quarter N:" or "Year N:"; all clauses of a pattern share one timeframe.
     condition_pattern = re.compile(r"(High|Low)\s+(touched|above|below)\s+(R[1-5]|S[1-5]|P)", re.IGNORECASE); monthly_parts = [p.strip() for p in pattern_text.split(';') if p.strip()]; parsed_structure = []
     for part in monthly_parts:
-        if ':' not in part: raise ValueError(f"Invalid month definition. Missing ':' in '{part}'")
-        month_def, conditions_str = part.split(':', 1); month_offset_match = re.search(r"Month\s+(-?\d+)", month_def, re.IGNORECASE)
-        if not month_offset_match: raise ValueError(f"Could not parse month offset from '{month_def}'")
-        offset = int(month_offset_match.group(1)); conditions_list_str = [c.strip() for c in conditions_str.split(' and ')]
+        if ':' not in part: raise ValueError(f"Invalid period definition. Missing ':' in '{part}'")
+        month_def, conditions_str = part.split(':', 1); month_offset_match = re.search(r"(Week|Month|Quarter|Year)\s+(-?\d+)", month_def, re.IGNORECASE)
+        if not month_offset_match: raise ValueError(f"Could not parse a Week, Month, Quarter or Year offset from '{month_def}'")
+        timeframe = month_offset_match.group(1).lower(); offset = int(month_offset_match.group(2)); conditions_list_str = [c.strip() for c in conditions_str.split(' and ')]
+        if parsed_structure and timeframe != parsed_structure[0]['timeframe']:
+            raise ValueError(f"All clauses of a pattern must use the same timeframe; found both {parsed_structure[0]['timeframe'].title()} and {timeframe.title()}")
         month_conditions = []
         for cond_str in conditions_list_str:
             match = condition_pattern.match(cond_str)
             if not match: raise ValueError(f"Invalid condition format: '{cond_str}'")
             month_conditions.append({'price_point': match.group(1).lower(), 'operator': match.group(2).lower(), 'pivot': match.group(3).upper()})
-        parsed_structure.append({'offset': offset, 'conditions': month_conditions})
+        parsed_structure.append({'offset': offset, 'conditions': month_conditions, 'timeframe': timeframe})
     parsed_structure.sort(key=lambda x: x['offset']); return parsed_structure
+
+def pattern_timeframe(parsed_pattern):
+    return parsed_pattern[0]['timeframe'] if parsed_pattern else 'month'
+
 def evaluate_condition(row, condition):
+    # Works on scalars or on whole columns; comparisons against a NaN pivot are always False.
     price = row[condition['price_point']]; pivot_value = row[condition['pivot']]; op = condition['operator']
-    if pd.isna(pivot_value): return False
     if op == 'touched': return price >= pivot_value if condition['price_point'] == 'high' else price <= pivot_value
     elif op == 'above': return price > pivot_value
     elif op == 'below': return price < pivot_value
-    return False
-
-def get_zone_name(price, pivots):
-    p = pivots
-    if not p or not isinstance(p, dict): return "Invalid Pivots"
-    levels = sorted([(k, v) for k, v in p.items() if k.startswith(('R', 'S', 'P')) and pd.notna(v)], 
-                    key=lambda item: item[1], reverse=True)
-    if not levels: return "No Pivots"
-    if price > levels[0][1]: return f"Above {levels[0][0]}"
-    for i in range(len(levels) - 1):
-        if levels[i+1][1] < price <= levels[i][1]:
-            return f"{levels[i+1][0]}-{levels[i][0]} Zone"
-    if price <= levels[-1][1]: return f"Below {levels[-1][0]}"
-    return "Unknown Zone"
-
-def get_detailed_outcome(daily_df_outcome, pivots):
-    if daily_df_outcome.empty: return []
-    first_week_df = daily_df_outcome.head(5)
-    last_week_df = daily_df_outcome.tail(5)
-    if first_week_df.empty or last_week_df.empty: return []
-    avg_close_first_week = first_week_df['close'].mean()
-    avg_close_last_week = last_week_df['close'].mean()
-    start_zone = get_zone_name(avg_close_first_week, pivots)
-    end_zone = get_zone_name(avg_close_last_week, pivots)
-    outcomes = {f"Ends in {end_zone}"}
-    if "Unknown" not in start_zone and "Unknown" not in end_zone and "Invalid" not in start_zone:
-        if start_zone != end_zone: outcomes.add(f"{start_zone} -> {end_zone}")
-        else: outcomes.add(f"Stays in {start_zone}")
-    return list(outcomes)
-    
-def run_analysis(ticker, start_date, end_date, parsed_pattern):
-    file_path = os.path.join(DATA_DIR, f"{ticker}.csv")
-    if not os.path.exists(file_path): return []
-    df = pd.read_csv(file_path, on_bad_lines='skip'); df.columns = [col.lower() for col in df.columns]; 
-    df['datetime'] = pd.to_datetime(df['datetime'], utc=True, errors='coerce').dt.tz_convert('Asia/Kolkata')
-    df.dropna(subset=['datetime'], inplace=True); df.set_index('datetime', inplace=True)
-    start_date_aware = pd.Timestamp(start_date, tz='Asia/Kolkata')
-    end_date_aware = pd.Timestamp(end_date, tz='Asia/Kolkata')
-    df_filtered = df.loc[start_date_aware:end_date_aware]
-    if df_filtered.empty: return []
-    monthly_df = df_filtered.resample('MS').agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last'}).dropna()
-    if len(monthly_df) < 2: return []
-    pivots_df = monthly_df.shift(1).apply(calculate_camarilla, axis=1)
-    combined_df = monthly_df.join(pivots_df.add_prefix('p_'))
-    matches = []
+    return np.zeros(np.shape(price), dtype=bool)
+
+def condition_key(condition):
+    return (condition['price_point'], condition['operator'], condition['pivot'])
+
+def find_pattern_matches(bars, parsed_pattern, condition_masks=None):
+    # Returns every index i where each clause holds on bar i + offset, i.e. all candidate periods in one pass.
+    # Each distinct condition is evaluated once over the whole series; pass a shared condition_masks
+    # dict to reuse those masks across several patterns on the same bars.
+    if condition_masks is None: condition_masks = {}
     max_offset = max(p['offset'] for p in parsed_pattern) if parsed_pattern else 0
     min_offset = min(p['offset'] for p in parsed_pattern) if parsed_pattern else 0
     start_index = -min_offset if min_offset < 0 else 0
-    end_index = len(combined_df) - (max_offset + 1)
-    for i in range(start_index, end_index):
-        pattern_match_found = True
-        for p in parsed_pattern:
-            offset_index = i + p['offset']
-            if not (0 <= offset_index < len(combined_df)):
-                pattern_match_found = False; break
-            target_month_row = combined_df.iloc[offset_index]
-            context_for_eval = {
-                'high': target_month_row['high'], 'low': target_month_row['low'],
-                'R1': target_month_row['p_R1'], 'R2': target_month_row['p_R2'], 'R3': target_month_row['p_R3'],
-                'R4': target_month_row['p_R4'], 'R5': target_month_row['p_R5'], 'P': target_month_row['p_P'],
-                'S1': target_month_row['p_S1'], 'S2': target_month_row['p_S2'], 'S3': target_month_row['p_S3'],
-                'S4': target_month_row['p_S4'], 'S5': target_month_row['p_S5']
-            }
-            if not all(evaluate_condition(context_for_eval, c) for c in p['conditions']):
-                pattern_match_found = False; break
-        if pattern_match_found:
-            outcome_index = i + max_offset + 1
-            if outcome_index < len(combined_df):
-                outcome_month_start = combined_df.index[outcome_index]
-                outcome_month_end = outcome_month_start + pd.offsets.MonthEnd(0)
-                daily_df_outcome = df_filtered.loc[outcome_month_start:outcome_month_end]
-                if daily_df_outcome.empty: continue
-                pivots_for_outcome = combined_df.iloc[outcome_index - 1].to_dict()
-                pivots_renamed = {k.replace('p_', ''):v for k,v in pivots_for_outcome.items() if k.startswith('p_')}
-                outcomes = get_detailed_outcome(daily_df_outcome, pivots_renamed)
-                if not outcomes: continue
-                match_data = {"premise_date": combined_df.index[i + max_offset].strftime('%Y-%m-%d'), "outcome_date": outcome_month_start.strftime('%Y-%m-%d'), "outcomes": outcomes}
-                matches.append(match_data)
+    end_index = len(bars['period']) - (max_offset + 1)
+    if end_index <= start_index: return np.empty(0, dtype=np.int64)
+    mask = np.ones(end_index - start_index, dtype=bool)
+    for p in parsed_pattern:
+        rows = slice(start_index + p['offset'], end_index + p['offset'])
+        for c in p['conditions']:
+            key = condition_key(c)
+            if key not in condition_masks:
+                condition_masks[key] = evaluate_condition({c['price_point']: bars[c['price_point']], c['pivot']: bars[f"p_{c['pivot']}"]}, c)
+            mask &= condition_masks[key][rows]
+    return np.flatnonzero(mask) + start_index
+
+def _zone_label(code):
+    if code == NO_PIVOTS_ZONE: return "No Pivots"
+    if code == UNKNOWN_ZONE: return "Unknown Zone"
+    lower, upper = divmod(code, ZONE_STRIDE)
+    if lower == ZONE_OPEN and upper == ZONE_OPEN: return "Unknown Zone"
+    if upper == ZONE_OPEN: return f"Above {PIVOT_LEVELS[lower]}"
+    if lower == ZONE_OPEN: return f"Below {PIVOT_LEVELS[upper]}"
+    return f"{PIVOT_LEVELS[lower]}-{PIVOT_LEVELS[upper]} Zone"
+
+ZONE_LABELS = [_zone_label(code) for code in range(UNKNOWN_ZONE + 1)]
+
+def get_zone_codes(prices, levels):
+    # levels is an (n, 11) matrix in PIVOT_LEVELS order. Levels are ranked high to low per row (ties keep
+    # PIVOT_LEVELS order, NaNs go last); the zone is bounded by the last level >= price and the first below it.
+    prices = np.asarray(prices, dtype=np.float64); rows = np.arange(len(prices))
+    order = np.argsort(-levels, axis=1, kind='stable')
+    ranked = np.take_along_axis(levels, order, axis=1)
+    n_valid = (~np.isnan(levels)).sum(axis=1)
+    k = (ranked >= prices[:, None]).sum(axis=1)
+    upper = np.where(k > 0, order[rows, np.maximum(k - 1, 0)], ZONE_OPEN)
+    lower = np.where(k < n_valid, order[rows, np.minimum(k, ZONE_OPEN - 1)], ZONE_OPEN)
+    codes = lower * ZONE_STRIDE + upper
+    codes = np.where(np.isnan(prices), UNKNOWN_ZONE, codes)
+    return np.where(n_valid == 0, NO_PIVOTS_ZONE, codes).astype(np.int16)
+
+def _window_mean(values, starts, ends, width=5):
+    idx = starts[:, None] + np.arange(width)
+    window = values[np.minimum(idx, len(values) - 1)]
+    valid = (idx < ends[:, None]) & ~np.isnan(window)
+    count = valid.sum(axis=1)
+    with np.errstate(invalid='ignore'): return np.where(valid, window, 0.0).sum(axis=1) / count
+
+def get_outcome_zones(closes, row_start, row_end, levels, sessions=5):
+    # Start zone from the average close of the period's first sessions, end zone from its last ones (five for a month).
+    avg_close_first_week = _window_mean(closes, row_start, np.minimum(row_start + sessions, row_end), sessions)
+    last_start = np.maximum(row_end - sessions, row_start)
+    avg_close_last_week = _window_mean(closes, last_start, row_end, sessions)
+    return get_zone_codes(avg_close_first_week, levels), get_zone_codes(avg_close_last_week, levels)
+
+def outcome_labels(start_zone, end_zone):
+    start_label, end_label = ZONE_LABELS[start_zone], ZONE_LABELS[end_zone]
+    outcomes = [f"Ends in {end_label}"]
+    if start_zone != UNKNOWN_ZONE and end_zone != UNKNOWN_ZONE:
+        outcomes.append(f"{start_label} -> {end_label}" if start_zone != end_zone else f"Stays in {start_label}")
+    return outcomes
+
+def load_ticker_bars(ticker, start_date, end_date, timeframes=('month',)):
+    # Returns (prices, {timeframe: bars}) for the date range, with bars None when there are fewer than two periods to study.
+    prices = load_price_data(ticker)
+    if prices is None: return None, dict.fromkeys(timeframes)
+    days = prices['days']
+    lo = np.searchsorted(days, date_to_day(start_date, round_up=True), side='left')
+    hi = np.searchsorted(days, date_to_day(end_date), side='right')
+    if lo >= hi: return prices, dict.fromkeys(timeframes)
+    by_timeframe = get_period_bars(ticker, prices, lo, hi, timeframes)
+    return prices, {timeframe: bars if bars is not None and len(bars['period']) >= 2 else None for timeframe, bars in by_timeframe.items()}
+
+def classify_outcomes(prices, bars, premise_index, timeframe='month'):
+    # The outcome period (premise + 1) is judged against the premise period's pivots.
+    outcome_index = premise_index + 1
+    levels = np.column_stack([bars[f'p_{level}'][premise_index] for level in PIVOT_LEVELS])
+    return get_outcome_zones(np.asarray(prices['close']), bars['row_start'][outcome_index], bars['row_end'][outcome_index], levels, OUTCOME_SESSIONS[timeframe])
+
+def build_match_array(bars, premise_index):
+    # Outcome zones come classified with the bars (see build_period_bars and _slice_bars).
+    matches = np.empty(len(premise_index), dtype=MATCH_DTYPE)
+    matches['premise_month'] = bars['period'][premise_index]; matches['outcome_month'] = bars['period'][premise_index + 1]
+    matches['start_zone'] = bars['start_zone'][premise_index]; matches['end_zone'] = bars['end_zone'][premise_index]
     return matches
 
+def match_bars(bars, parsed_pattern, condition_masks=None):
+    # Returns (premise bar indices, MATCH_DTYPE array) for a pattern over one ticker's bars.
+    max_offset = max(p['offset'] for p in parsed_pattern) if parsed_pattern else 0
+    with stage_timer('matching'): premise_index = find_pattern_matches(bars, parsed_pattern, condition_masks) + max_offset
+    return premise_index, build_match_array(bars, premise_index)
+
+def analyze_ticker(ticker, start_date, end_date, parsed_pattern):
+    with stage_timer(ticker=ticker):
+        timeframe = pattern_timeframe(parsed_pattern)
+        _, by_timeframe = load_ticker_bars(ticker, start_date, end_date, (timeframe,))
+        if by_timeframe[timeframe] is None: return np.empty(0, dtype=MATCH_DTYPE)
+        return match_bars(by_timeframe[timeframe], parsed_pattern)[1]
+
+def screen_ticker(ticker, start_date, end_date, parsed_patterns):
+    """Evaluates several parsed patterns against one ticker, loading its bars once. Returns one match array per pattern."""
+    with stage_timer(ticker=ticker):
+        timeframes = tuple(dict.fromkeys(pattern_timeframe(parsed_pattern) for parsed_pattern in parsed_patterns))
+        _, by_timeframe = load_ticker_bars(ticker, start_date, end_date, timeframes)
+        condition_masks = defaultdict(dict); results = []
+        for parsed_pattern in parsed_patterns:
+            timeframe = pattern_timeframe(parsed_pattern); bars = by_timeframe[timeframe]
+            results.append(match_bars(bars, parsed_pattern, condition_masks[timeframe])[1] if bars is not None else np.empty(0, dtype=MATCH_DTYPE))
+        return results
+
+def sweep_lead(parsed_pattern):
+    """Bars a date range must hold before a match's premise bar for the match to be found within it.
+
+    The range's first bar has no pivots, so every clause period must come after it; find_pattern_matches also
+    never looks before the first bar or places a premise before max_offset.
+    """
+    max_offset = max(p['offset'] for p in parsed_pattern) if parsed_pattern else 0
+    min_offset = min(p['offset'] for p in parsed_pattern) if parsed_pattern else 0
+    return max(max_offset - min(min_offset, 0), max_offset - min_offset + 1)
+
+def sweep_ticker(ticker, start_date, end_date, parsed_pattern):
+    """analyze_ticker plus each match's anchor period: the latest period a window may start in and still find the match."""
+    with stage_timer(ticker=ticker):
+        timeframe = pattern_timeframe(parsed_pattern)
+        _, by_timeframe = load_ticker_bars(ticker, start_date, end_date, (timeframe,))
+        bars = by_timeframe[timeframe]
+        if bars is None: return np.empty(0, dtype=MATCH_DTYPE), np.empty(0, dtype=np.int64)
+        premise_index, matches = match_bars(bars, parsed_pattern)
+        return matches, bars['period'][premise_index - sweep_lead(parsed_pattern)]
+
+def matches_to_dicts(matches, timeframe='month'):
+    premise_dates, outcome_dates = period_label(matches['premise_month'], timeframe), period_label(matches['outcome_month'], timeframe)
+    return [{"premise_date": str(p), "outcome_date": str(o), "outcomes": outcome_labels(int(s), int(e))}
+            for p, o, s, e in zip(premise_dates, outcome_dates, matches['start_zone'], matches['end_zone'])]
+
+def run_analysis(ticker, start_date, end_date, parsed_pattern):
+    return matches_to_dicts(analyze_ticker(ticker, start_date, end_date, parsed_pattern), pattern_timeframe(parsed_pattern))
+
+# MIND EXECUTION
+# Universe runs are split into chunks of MIND_CHUNK_SIZE tickers and fanned out over a process pool of
+# MIND_WORKERS processes. Workers return compact match arrays and chunk order is preserved, so the merged
+# matches are identical to the serial path (used when MIND_WORKERS <= 1, for small universes, or if the pool breaks).
+_mind_pool = None
+_mind_pool_lock = threading.Lock()
+
+def _get_mind_pool():
+    global _mind_pool
+    with _mind_pool_lock:
+        if _mind_pool is None:
+            _mind_pool = ProcessPoolExecutor(max_workers=app.config['MIND_WORKERS'], mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_init_mind_worker, initargs=(DATA_DIR, PRICE_STORE_DIR))
+        return _mind_pool
+
+def _init_mind_worker(data_dir, price_store_dir):
+    # Workers are spawned fresh, so carry over data locations the parent may have changed (e.g. by `flask bench run`).
+    global DATA_DIR, PRICE_STORE_DIR
+    DATA_DIR, PRICE_STORE_DIR = data_dir, price_store_dir
+
+def _reset_mind_pool(broken_pool=None):
+    """Shuts the pool down; given broken_pool, only if it is still the current pool (another run may have replaced it)."""
+    global _mind_pool
+    with _mind_pool_lock:
+        if broken_pool is not None and _mind_pool is not broken_pool: return
+        if _mind_pool is not None: _mind_pool.shutdown(wait=False, cancel_futures=True)
+        _mind_pool = None
+
+def _log_broken_pool():
+    app.logger.warning("Mind process pool broke, falling back to serial execution", exc_info=True)
+    return True
+
+class MindRunCancelled(Exception):
+    pass
+
+# Chunk functions return (per-ticker results, exported StageTimings) so worker timings reach the caller.
+def _analyze_ticker_chunk(tickers, start_date, end_date, parsed_pattern):
+    with collect_timings() as timings: matches = [analyze_ticker(ticker, start_date, end_date, parsed_pattern) for ticker in tickers]
+    return matches, timings.export()
+
+def _screen_ticker_chunk(tickers, start_date, end_date, parsed_patterns):
+    with collect_timings() as timings: matches = [screen_ticker(ticker, start_date, end_date, parsed_patterns) for ticker in tickers]
+    return matches, timings.export()
+
+def _sweep_ticker_chunk(tickers, start_date, end_date, parsed_pattern):
+    with collect_timings() as timings: matches = [sweep_ticker(ticker, start_date, end_date, parsed_pattern) for ticker in tickers]
+    return matches, timings.export()
+
+def _empty_ticker_result(chunk_fn, parsed_pattern):
+    # What chunk_fn returns for a ticker with no bars in the range.
+    if chunk_fn is _screen_ticker_chunk: return [np.empty(0, dtype=MATCH_DTYPE) for _ in parsed_pattern]
+    if chunk_fn is _sweep_ticker_chunk: return np.empty(0, dtype=MATCH_DTYPE), np.empty(0, dtype=np.int64)
+    return np.empty(0, dtype=MATCH_DTYPE)
+
+def run_mind_analysis(tickers, start_date, end_date, parsed_pattern, on_chunk=None, cancel_event=None, chunk_fn=_analyze_ticker_chunk):
+    """Returns one match array per ticker, in the same order as tickers.
+
+    on_chunk(chunk_tickers, chunk_matches) is called as each chunk finishes (in completion order);
+    setting cancel_event stops the run between chunks with MindRunCancelled. chunk_fn is the
+    per-chunk worker; _screen_ticker_chunk returns a list of match arrays (one per pattern) per ticker
+    and _sweep_ticker_chunk a (matches, anchor periods) pair.
+    """
+    covered = data_catalog.covering(tickers, start_date, end_date)
+    if len(covered) < len(tickers):
+        # Tickers without data in the range have no matches; they get an empty result and only the rest are run.
+        empty = _empty_ticker_result(chunk_fn, parsed_pattern); covered_set = set(covered); skipped = [t for t in tickers if t not in covered_set]
+        if on_chunk is not None: on_chunk(skipped, [empty] * len(skipped))
+        computed = dict(zip(covered, run_mind_analysis(covered, start_date, end_date, parsed_pattern, on_chunk, cancel_event, chunk_fn)))
+        return [computed[t] if t in computed else empty for t in tickers]
+    chunk_size = max(1, app.config['MIND_CHUNK_SIZE'])
+    chunks = [tickers[i:i + chunk_size] for i in range(0, len(tickers), chunk_size)]
+    results = [None] * len(chunks); timings = current_timings()
+    def record(index, chunk_result):
+        chunk_matches, chunk_timings = chunk_result
+        if timings is not None: timings.merge(chunk_timings)
+        results[index] = chunk_matches
+        if on_chunk is not None: on_chunk(chunks[index], chunk_matches)
+    def check_cancelled():
+        if cancel_event is not None and cancel_event.is_set(): raise MindRunCancelled()
+    if app.config['MIND_WORKERS'] > 1 and len(chunks) > 1:
+        futures = {}; pool = None; broken = False
+        try:
+            # Only a broken pool falls back to serial execution; exceptions raised by a chunk itself propagate.
+            try:
+                pool = _get_mind_pool()
+                futures = {pool.submit(chunk_fn, chunk, start_date, end_date, parsed_pattern): i for i, chunk in enumerate(chunks)}
+            except (BrokenProcessPool, OSError): broken = _log_broken_pool()
+            for future in (() if broken else as_completed(futures)):
+                check_cancelled()
+                try: chunk_result = future.result()
+                except BrokenProcessPool: broken = _log_broken_pool(); break
+                record(futures[future], chunk_result)
+            if broken: _reset_mind_pool(pool)
+        finally:
+            for future in futures: future.cancel()
+    for i, chunk in enumerate(chunks):
+        if results[i] is not None: continue
+        check_cancelled()
+        record(i, chunk_fn(chunk, start_date, end_date, parsed_pattern))
+    return [matches for chunk_matches in results for matches in chunk_matches]
+
+# PERSISTENT MATCH CACHE
+# Per-ticker match arrays are stored in cache/match_cache.db keyed by the canonical pattern, ticker and
+# normalized date range; each row also records the data version it was computed from and is recomputed
+# when the CSV changes. Rows unused for MATCH_CACHE_MAX_AGE_DAYS are dropped, then the least recently
+# used rows until the cache fits in MATCH_CACHE_MAX_BYTES.
+def canonicalize_pattern(parsed_pattern):
+    # Clauses on the same month are ANDed, so merge them; conditions are deduplicated and sorted.
+    by_offset = defaultdict(set)
+    for p in parsed_pattern:
+        by_offset[p['offset']].update(condition_key(c) for c in p['conditions'])
+    timeframe = pattern_timeframe(parsed_pattern).title()
+    return '; '.join(f"{timeframe} {offset}: " + ' and '.join(' '.join(key) for key in sorted(keys)) for offset, keys in sorted(by_offset.items()))
+
+def normalize_date(date_value, round_up=False):
+    return str(np.datetime64(int(date_to_day(date_value, round_up)), 'D'))
+
+class MatchCache:
+    def __init__(self, path):
+        self.path = path; self._lock = threading.Lock(); self._initialized = False
+        self.hits = 0; self.misses = 0; self.evictions = 0
+
+    def _connect(self):
+        if not self._initialized: os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        db = connect_db(self.path)
+        if not self._initialized:
+            with self._lock:
+                db.execute('''
+                    CREATE TABLE IF NOT EXISTS match_cache (
+                        pattern TEXT NOT NULL, ticker TEXT NOT NULL, start_date TEXT NOT NULL, end_date TEXT NOT NULL,
+                        data_version TEXT NOT NULL, matches BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL,
+                        PRIMARY KEY (pattern, ticker, start_date, end_date)
+                    )''')
+                db.execute("CREATE INDEX IF NOT EXISTS idx_match_cache_last_used ON match_cache (last_used)")
+                db.commit(); self._initialized = True
+        return db
+
+    def lookup(self, pattern, tickers, start_date, end_date, versions):
+        """Returns {ticker: match array} for tickers cached at their current data version."""
+        found = {}
+        if not tickers: return found
+        db = self._connect()
+        for i in range(0, len(tickers), 500):
+            batch = tickers[i:i + 500]
+            rows = db.execute(f"SELECT ticker, data_version, matches FROM match_cache WHERE pattern = ? AND start_date = ? AND end_date = ? AND ticker IN ({','.join('?' * len(batch))})", (pattern, start_date, end_date, *batch)).fetchall()
+            for ticker, data_version, blob in rows:
+                if data_version == versions.get(ticker): found[ticker] = np.frombuffer(blob, dtype=MATCH_DTYPE)
+        if found:
+            db.executemany("UPDATE match_cache SET last_used = ? WHERE pattern = ? AND ticker = ? AND start_date = ? AND end_date = ?", [(time.time(), pattern, t, start_date, end_date) for t in found])
+            db.commit()
+        with self._lock: self.hits += len(found); self.misses += len(tickers) - len(found)
+        return found
+
+    def store(self, pattern, start_date, end_date, versions, computed):
+        rows = [(pattern, t, start_date, end_date, versions[t], m.tobytes(), m.nbytes, time.time()) for t, m in computed.items() if versions.get(t)]
+        if not rows: return
+        db = self._connect()
+        with db:
+            db.executemany("INSERT OR REPLACE INTO match_cache (pattern, ticker, start_date, end_date, data_version, matches, size, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            evicted = db.execute("DELETE FROM match_cache WHERE last_used < ?", (time.time() - app.config['MATCH_CACHE_MAX_AGE_DAYS'] * 86400,)).rowcount
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM match_cache").fetchone()[0]
+            if total > app.config['MATCH_CACHE_MAX_BYTES']:
+                # Drop least recently used rows until the cache fits again.
+                excess = total - app.config['MATCH_CACHE_MAX_BYTES']; victims = []
+                for rowid, size in db.execute("SELECT rowid, size FROM match_cache ORDER BY last_used"):
+                    if excess <= 0: break
+                    victims.append((rowid,)); excess -= size
+                db.executemany("DELETE FROM match_cache WHERE rowid = ?", victims); evicted += len(victims)
+        with self._lock: self.evictions += evicted
+
+    def stats(self):
+        entries, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM match_cache").fetchone()
+        with self._lock:
+            return {'entries': entries, 'bytes': size, 'max_bytes': app.config['MATCH_CACHE_MAX_BYTES'],
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+match_cache = MatchCache(MATCH_CACHE_DB)
+
+def run_cached_analysis(tickers, start_date, end_date, parsed_pattern, on_chunk=None, cancel_event=None):
+    """run_mind_analysis, computing only the tickers missing from the match cache.
+
+    Returns (per-ticker match arrays in ticker order, cache statistics for this run). Tickers the data catalog shows
+    have no rows in the range are skipped without a lookup.
+    """
+    pattern = canonicalize_pattern(parsed_pattern)
+    start_key, end_key = normalize_date(start_date, round_up=True), normalize_date(end_date)
+    covered = data_catalog.covering(tickers, start_date, end_date)
+    with stage_timer('match_cache'):
+        versions = {ticker: get_data_version(ticker) for ticker in covered}
+        cached = match_cache.lookup(pattern, covered, start_key, end_key, versions)
+    empty = np.empty(0, dtype=MATCH_DTYPE); skipped = [t for t in tickers if t not in versions]
+    if skipped and on_chunk is not None: on_chunk(skipped, [empty] * len(skipped))
+    if cached and on_chunk is not None: on_chunk([t for t in covered if t in cached], [cached[t] for t in covered if t in cached])
+    missing = [t for t in covered if t not in cached]
+    computed = dict(zip(missing, run_mind_analysis(missing, start_date, end_date, parsed_pattern, on_chunk=on_chunk, cancel_event=cancel_event)))
+    with stage_timer('match_cache'): match_cache.store(pattern, start_key, end_key, versions, computed)
+    return [cached[t] if t in cached else computed.get(t, empty) for t in tickers], {'hits': len(cached), 'misses': len(missing), 'skipped': len(tickers) - len(covered)}
+
 def get_histogram_data(probabilities):
     if not probabilities or len(probabilities) < 2: return None
     values = np.array([p['probability'] for p in probabilities])
@@ -163,50 +1192,96 @@ def get_histogram_data(probabilities):
     counts, bin_edges = np.histogram(values, bins=10, range=(0, 100))
     return {'counts': counts.tolist(), 'bin_edges': bin_edges.tolist()}
 
-def process_and_package_results(historical_matches, test_type, ticker=None):
-    if not historical_matches: return None
-    
+# Outcomes are integer-coded for counting: "Ends in <zone>" is the end zone code itself, and the month's transition
+# ("A -> B", or "Stays in A" when A == B) is OUTCOME_ZONES + start_zone * OUTCOME_ZONES + end_zone.
+OUTCOME_ZONES = UNKNOWN_ZONE + 1
+
+def outcome_code_label(code):
+    if code < OUTCOME_ZONES: return f"Ends in {ZONE_LABELS[code]}"
+    start_zone, end_zone = divmod(code - OUTCOME_ZONES, OUTCOME_ZONES)
+    return f"Stays in {ZONE_LABELS[start_zone]}" if start_zone == end_zone else f"{ZONE_LABELS[start_zone]} -> {ZONE_LABELS[end_zone]}"
+
+def tally_outcomes(codes, order, label=outcome_code_label):
+    """Counts integer codes with np.bincount; order gives each code's position in the flattened outcome sequence.
+
+    Returns {label: count} in order of first appearance, so a stable sort by descending count reproduces
+    pd.Series(labels).value_counts().
+    """
+    if len(codes) == 0: return {}
+    counts = np.bincount(codes); first_seen = np.full(len(counts), np.iinfo(np.int64).max)
+    np.minimum.at(first_seen, codes, order)
+    present = np.flatnonzero(counts)
+    return {label(int(code)): counts[code] for code in present[np.argsort(first_seen[present], kind='stable')]}
+
+def outcome_probabilities(tally, total):
+    return [{"state": state, "probability": round((count / total) * 100, 2)} for state, count in sorted(tally.items(), key=lambda item: -item[1])]
+
+def outcome_codes(matches):
+    """Returns (ends, transitions, has_transition) outcome codes for a match array; transitions exist unless a zone is unknown."""
+    start_zone, end_zone = matches['start_zone'].astype(np.int64), matches['end_zone'].astype(np.int64)
+    has_transition = (start_zone != UNKNOWN_ZONE) & (end_zone != UNKNOWN_ZONE)
+    return end_zone, OUTCOME_ZONES + start_zone * OUTCOME_ZONES + end_zone, has_transition
+
+def interleave_outcomes(ends, transitions, end_mask, transition_mask):
+    # Match i contributes its "Ends in" outcome then (if any) its transition, at sequence positions 2i and 2i + 1.
+    positions = np.arange(len(ends))
+    return (np.concatenate([ends[end_mask], transitions[transition_mask]]),
+            np.concatenate([2 * positions[end_mask], 2 * positions[transition_mask] + 1]))
+
+def concat_ticker_matches(per_ticker_matches):
+    """Joins per-ticker match arrays into one, returning it with each match's index into the ticker list."""
+    if not per_ticker_matches: return np.empty(0, dtype=MATCH_DTYPE), np.empty(0, dtype=np.int64)
+    lengths = [len(matches) for matches in per_ticker_matches]
+    return np.concatenate(per_ticker_matches), np.repeat(np.arange(len(lengths)), lengths)
+
+def ticker_breakdown(codes, order, tickers, ticker_index):
+    # A (ticker, outcome) histogram over the outcome codes present; each ticker's top outcome breaks count ties by
+    # first appearance, as in the overall table.
+    present, compact = np.unique(codes, return_inverse=True)
+    cells = ticker_index * len(present) + compact; shape = (len(tickers), len(present))
+    grid = np.bincount(cells, minlength=shape[0] * shape[1]).reshape(shape)
+    first_seen = np.full(shape[0] * shape[1], np.iinfo(np.int64).max); np.minimum.at(first_seen, cells, order)
+    top = np.where(grid == grid.max(axis=1, keepdims=True), first_seen.reshape(shape), np.iinfo(np.int64).max).argmin(axis=1)
+    totals = np.bincount(ticker_index[order % 2 == 0], minlength=len(tickers))
+    return [{"ticker": tickers[t], "total": int(totals[t]),
+             "top_outcome": {"state": outcome_code_label(int(present[top[t]])), "probability": round((grid[t, top[t]] / totals[t]) * 100, 2)}}
+            for t in np.flatnonzero(totals)]
+
+@timed('packaging')
+def process_and_package_results(matches, test_type, ticker=None, tickers=None, ticker_index=None, timeframe='month'):
+    """Summarizes a MATCH_DTYPE array. With tickers and ticker_index (see concat_ticker_matches) a per-ticker breakdown is added.
+
+    Results of non-monthly patterns record their timeframe, which also dates the history entries.
+    """
+    if len(matches) == 0: return None
+    ends, transitions, has_transition = outcome_codes(matches)
+    is_path = has_transition & (matches['start_zone'] != matches['end_zone'])
+    positions = np.arange(len(matches))
+
     # --- Overall Probabilities ---
-    all_outcomes_flat = [outcome for match in historical_matches for outcome in match['outcomes']]
-    total_matches_all = len(historical_matches)
-    counts_all = pd.Series(all_outcomes_flat).value_counts()
-    probs_all = [{"state": state, "probability": round((count / total_matches_all) * 100, 2)} for state, count in counts_all.items()] if total_matches_all > 0 else []
-    
+    total_matches_all = len(matches)
+    all_codes, all_order = interleave_outcomes(ends, transitions, np.ones(len(matches), dtype=bool), has_transition)
+    probs_all = outcome_probabilities(tally_outcomes(all_codes, all_order), total_matches_all)
+
     # --- Singular Probabilities ---
-    singular_matches = [m['outcomes'] for m in historical_matches if not any('->' in o for o in m['outcomes'])]
-    total_matches_singular = len(singular_matches)
-    singular_outcomes_flat = [o for sublist in singular_matches for o in sublist]
-    probs_singular = []
-    if singular_outcomes_flat and total_matches_singular > 0:
-        counts_singular = pd.Series(singular_outcomes_flat).value_counts()
-        probs_singular = [{"state": state, "probability": round((count / total_matches_singular) * 100, 2)} for state, count in counts_singular.items()]
-    
+    singular = ~is_path; stays = singular & has_transition
+    total_matches_singular = int(singular.sum())
+    tally_singular = tally_outcomes(*interleave_outcomes(ends, transitions, singular, stays))
+    probs_singular = outcome_probabilities(tally_singular, total_matches_singular)
+
     # --- Path Probabilities ---
-    path_matches = [m['outcomes'] for m in historical_matches if any('->' in o for o in m['outcomes'])]
-    total_matches_path = len(path_matches)
-    path_outcomes_flat = [o for sublist in path_matches for o in sublist if '->' in o]
-    probs_path = []
-    if path_outcomes_flat and total_matches_path > 0:
-        counts_path = pd.Series(path_outcomes_flat).value_counts()
-        probs_path = [{"state": state, "probability": round((count / total_matches_path) * 100, 2)} for state, count in counts_path.items()]
-    
+    total_matches_path = int(is_path.sum())
+    probs_path = outcome_probabilities(tally_outcomes(transitions[is_path], positions[is_path]), total_matches_path)
+
     # --- NEW: Conditional Probabilities by Starting Zone ---
-    probs_by_start_zone = defaultdict(lambda: defaultdict(int))
-    total_by_start_zone = defaultdict(int)
-    for match in path_matches:
-        for outcome in match:
-            if '->' in outcome:
-                start_zone, end_zone = [p.strip() for p in outcome.split('->')]
-                probs_by_start_zone[start_zone][end_zone] += 1
-                total_by_start_zone[start_zone] += 1
-    
+    # The path transition codes double as a (start, end) histogram; zones keep their first-appearance order.
+    pair_counts = tally_outcomes(transitions[is_path] - OUTCOME_ZONES, positions[is_path], label=lambda code: divmod(code, OUTCOME_ZONES))
+    total_by_start_zone = Counter()
+    for (start_zone, _), count in pair_counts.items(): total_by_start_zone[start_zone] += int(count)
     final_probs_by_start_zone = {}
-    for start_zone, end_zones in probs_by_start_zone.items():
-        total = total_by_start_zone[start_zone]
-        final_probs_by_start_zone[start_zone] = [
-            {"state": end_zone, "probability": round((count / total) * 100, 2)}
-            for end_zone, count in end_zones.items()
-        ]
+    for (start_zone, end_zone), count in pair_counts.items():
+        final_probs_by_start_zone.setdefault(ZONE_LABELS[start_zone], []).append(
+            {"state": ZONE_LABELS[end_zone], "probability": round((int(count) / total_by_start_zone[start_zone]) * 100, 2)})
 
     # --- Package all results ---
     results_json = {
@@ -223,16 +1298,279 @@ def process_and_package_results(historical_matches, test_type, ticker=None):
         }
     }
     
+    if timeframe != 'month': results_json["timeframe"] = timeframe
     if test_type == 'Single':
         results_json["total_matches"] = total_matches_all
-        history_for_json = [{"premise_date": m["premise_date"], "outcome_date": m["outcome_date"], "state": ", ".join(sorted(m['outcomes'], key=lambda x: ('->' in x, x)))} for m in historical_matches]
-        results_json["history"] = history_for_json
+        results_json["history"] = match_history(matches, timeframe)
         results_json["ticker"] = ticker
     else:
         results_json["total_historical_matches"] = total_matches_all
+        if tickers is not None: results_json["by_ticker"] = ticker_breakdown(all_codes, all_order, tickers, ticker_index[all_order // 2])
         
     return results_json
 
+def resolve_universe(universe):
+    if universe == 'All Tickers': return data_catalog.tickers()
+    return data_catalog.universes().get(universe, [])
+
+# WALK-FORWARD SWEEPS
+# A sweep evaluates a pattern over rolling windows of whole periods of its timeframe (calendar months for a Month
+# pattern). Matches are computed once over the span of all windows; a match falls in every window that starts no later
+# than its anchor period (see sweep_ticker) and ends no earlier than its outcome period, which is exactly the set a
+# separate run over that window would find. Each match
+# therefore covers a contiguous run of window indices, and per-window outcome counts are a cumulative sum over a
+# difference array instead of one analysis per window.
+def sweep_period_range(start_date, end_date, timeframe='month'):
+    """Returns the first and last whole periods (as period codes) between two dates."""
+    first_day, last_day = date_to_day(start_date, round_up=True), date_to_day(end_date)
+    first_period, last_period = period_codes([first_day, last_day + 1], timeframe)
+    if period_start_days([first_period], timeframe)[0] != first_day: first_period += 1
+    return int(first_period), int(last_period) - 1
+
+def period_dates(first_period, last_period, timeframe='month'):
+    # First day of first_period and last day of last_period, as ISO dates.
+    start, end = period_start_days([first_period, last_period + 1], timeframe).astype('datetime64[D]')
+    return str(start), str(end - 1)
+
+def window_counts(columns, first_window, last_window, n_windows, n_columns):
+    """Adds one to column c of every window in [first_window, last_window] for each (c, first, last); returns (n_windows, n_columns)."""
+    diff = np.bincount(first_window * n_columns + columns, minlength=(n_windows + 1) * n_columns) - np.bincount((last_window + 1) * n_columns + columns, minlength=(n_windows + 1) * n_columns)
+    return np.cumsum(diff.reshape(n_windows + 1, n_columns), axis=0)[:-1]
+
+def build_sweep_results(per_ticker, tickers, window_starts, window_periods, timeframe='month', by_ticker=False):
+    """Per-window probability tables and a stability summary from _sweep_ticker_chunk results; None if nothing matched."""
+    matches, ticker_index = concat_ticker_matches([ticker_matches for ticker_matches, _ in per_ticker])
+    if len(matches) == 0: return None
+    anchors = np.concatenate([ticker_anchors for _, ticker_anchors in per_ticker])
+    overall = process_and_package_results(matches, 'Mind', tickers=tickers if by_ticker else None, ticker_index=ticker_index, timeframe=timeframe)
+    n_windows = len(window_starts); step = int(window_starts[1] - window_starts[0]) if n_windows > 1 else 1
+    first_window = np.maximum(-((window_starts[0] + window_periods - 1 - matches['outcome_month'].astype(np.int64)) // step), 0)
+    last_window = np.minimum((anchors - window_starts[0]) // step, n_windows - 1)
+    placed = first_window <= last_window
+
+    ends, transitions, has_transition = outcome_codes(matches)
+    codes, order = interleave_outcomes(ends, transitions, placed, has_transition & placed)
+    present, columns = np.unique(codes, return_inverse=True)
+    first_seen = np.full(len(present), np.iinfo(np.int64).max); np.minimum.at(first_seen, columns, order)
+    rank = np.argsort(first_seen, kind='stable'); labels = [outcome_code_label(int(code)) for code in present]
+    counts = window_counts(columns, first_window[order // 2], last_window[order // 2], n_windows, len(present))
+    totals = window_counts(np.zeros(int(placed.sum()), dtype=np.int64), first_window[placed], last_window[placed], n_windows, 1)[:, 0]
+
+    # Rounded as a whole (np.round is what round() on a NumPy float uses, so values match outcome_probabilities); each
+    # window's table lists its outcomes by descending count, ties in order of first appearance over the whole span.
+    with np.errstate(invalid='ignore'): window_probs = counts / totals[:, None] * 100
+    rounded = np.round(window_probs, 2).tolist()
+    by_count = rank[np.argsort(-counts[:, rank], axis=1, kind='stable')]
+    windows = []
+    for i, window_start in enumerate(window_starts):
+        start_date, end_date = period_dates(int(window_start), int(window_start) + window_periods - 1, timeframe)
+        present_columns = by_count[i, :np.count_nonzero(counts[i])].tolist()
+        windows.append({'start_date': start_date, 'end_date': end_date, 'total_matches': int(totals[i]),
+                        'probabilities': [{"state": labels[k], "probability": rounded[i][k]} for k in present_columns]})
+
+    # --- Stability of each outcome across the windows that have matches ---
+    active = totals > 0
+    window_probs = window_probs[active]
+    tops = Counter(window['probabilities'][0]['state'] for window in windows if window['probabilities'])
+    column = {label: k for k, label in enumerate(labels)}; outcomes = []
+    for entry in overall['probabilities']['all']:
+        k = column.get(entry['state'])
+        probs = window_probs[:, k] if k is not None else np.zeros(int(active.sum()))
+        outcomes.append({'state': entry['state'], 'overall_probability': entry['probability'],
+                         'mean': round(float(probs.mean()), 2) if len(probs) else None, 'std': round(float(probs.std()), 2) if len(probs) else None,
+                         'min': round(float(probs.min()), 2) if len(probs) else None, 'max': round(float(probs.max()), 2) if len(probs) else None,
+                         'windows_present': int((probs > 0).sum()), 'windows_top': tops.get(entry['state'], 0)})
+    top_state, top_windows = tops.most_common(1)[0] if tops else (None, 0)
+    stability = {'windows': n_windows, 'windows_with_matches': int(active.sum()),
+                 'matches_per_window': {'min': int(totals.min()), 'max': int(totals.max()), 'mean': round(float(totals.mean()), 2)},
+                 'top_outcome': {'state': top_state, 'windows': top_windows, 'share': round(top_windows / int(active.sum()) * 100, 2) if active.any() else 0},
+                 'outcomes': outcomes}
+    return {'overall': overall, 'windows': windows, 'stability': stability}
+
+# LIVE SETUPS
+# The current-setups screener lists the saved patterns whose premise holds on each ticker's latest bars: the pattern's
+# last clause falls on the period holding the ticker's latest session (possibly still in progress), so its outcome is
+# the next period. Nothing is backtested; each pattern is checked against its few bars of the cached full-history bars.
+# Results are indexed per ticker and data version. Appending bars refreshes the ticker straight away, a ticker whose
+# CSV changed otherwise is refreshed on the next read, and newly saved patterns are checked on the first read after.
+def append_daily_bars(ticker, df):
+    """Appends new daily rows for a ticker and updates the price store, bar cache and setup index incrementally."""
+    if ticker not in resolve_universe('All Tickers'): raise ValueError(f"No data file for ticker '{ticker}'.")
+    old_prices, prices = append_price_rows(ticker, df)
+    bar_cache.extend(ticker, old_prices['version'], prices, len(old_prices['days']))
+    setups = setup_index.refresh(ticker)
+    return {'ticker': ticker, 'rows_added': len(prices['days']) - len(old_prices['days']), 'rows': len(prices['days']),
+            'last_date': str(np.datetime64(int(prices['days'][-1]), 'D')), 'setups': sorted(setups, key=lambda s: s['pattern'])}
+
+def saved_patterns():
+    """{pattern_hash: pattern text} with one text per distinct canonical pattern in the history."""
+    return {row[0]: row[1] for row in connect_db().execute("SELECT pattern_hash, MIN(pattern) FROM backtests GROUP BY pattern_hash")}
+
+def premise_holds_at(bars, parsed_pattern, premise_index):
+    """Whether every clause holds with the pattern's last clause on bar premise_index."""
+    max_offset = max(p['offset'] for p in parsed_pattern)
+    for p in parsed_pattern:
+        i = premise_index - max_offset + p['offset']
+        if i < 0: return False
+        if not all(evaluate_condition({c['price_point']: bars[c['price_point']][i], c['pivot']: bars[f"p_{c['pivot']}"][i]}, c) for c in p['conditions']): return False
+    return True
+
+def find_current_setups(ticker, patterns):
+    """Returns (data version, {pattern_hash: setup}) for the patterns ({hash: (text, parsed)}) live on the ticker's latest bars."""
+    prices = load_price_data(ticker)
+    if prices is None or len(prices['days']) == 0: return (prices['version'] if prices else None), {}
+    timeframes = tuple(dict.fromkeys(pattern_timeframe(parsed) for _, parsed in patterns.values()))
+    by_timeframe = bar_cache.get(ticker, prices, timeframes) if timeframes else {}
+    last_date = str(np.datetime64(int(prices['days'][-1]), 'D')); setups = {}
+    for key, (pattern, parsed) in patterns.items():
+        timeframe = pattern_timeframe(parsed); bars = by_timeframe[timeframe]
+        if bars is None or len(bars['period']) == 0 or not premise_holds_at(bars, parsed, len(bars['period']) - 1): continue
+        premise_period = int(bars['period'][-1])
+        premise_date, outcome_date = period_label([premise_period, premise_period + 1], timeframe)
+        setups[key] = {'ticker': ticker, 'pattern': pattern, 'timeframe': timeframe, 'premise_date': str(premise_date), 'outcome_date': str(outcome_date), 'last_date': last_date}
+    return prices['version'], setups
+
+class SetupIndex:
+    def __init__(self):
+        self._tickers = {}; self._patterns = {}; self._lock = threading.Lock()
+
+    def _parsed(self, patterns):
+        # Parses each saved pattern once; ones that no longer parse are left out.
+        with self._lock:
+            for key, pattern in patterns.items():
+                if key not in self._patterns:
+                    try: self._patterns[key] = (pattern, parse_advanced_pattern(pattern) or None)
+                    except ValueError: self._patterns[key] = (pattern, None)
+            return {key: self._patterns[key] for key in patterns if self._patterns[key][1] is not None}
+
+    def refresh(self, ticker, patterns=None):
+        """Re-evaluates every saved pattern for the ticker; returns its live setups."""
+        patterns = self._parsed(saved_patterns()) if patterns is None else patterns
+        version, setups = find_current_setups(ticker, patterns)
+        with self._lock: self._tickers[ticker] = (version, frozenset(patterns), setups)
+        return list(setups.values())
+
+    def setups(self, tickers):
+        """Returns (number of saved patterns, live setups of the tickers), refreshing only stale or incomplete entries."""
+        patterns = self._parsed(saved_patterns()); live = []
+        for ticker in tickers:
+            with self._lock: entry = self._tickers.get(ticker)
+            if entry is None or entry[0] != get_data_version(ticker): live.extend(self.refresh(ticker, patterns)); continue
+            version, checked, setups = entry
+            missing = {key: value for key, value in patterns.items() if key not in checked}
+            if missing:
+                _, added = find_current_setups(ticker, missing); setups = {**setups, **added}
+                with self._lock: self._tickers[ticker] = (version, checked | frozenset(missing), setups)
+            live.extend(setup for key, setup in setups.items() if key in patterns)
+        return len(patterns), live
+
+setup_index = SetupIndex()
+
+@timed('db_insert')
+def save_backtests(tests):
+    """Inserts (test_type, test_name, pattern, params, results_json, notes, matches) tuples in one transaction; returns their ids.
+
+    When matches (a MATCH_DTYPE array) is given, the results' history list is stored as rows of backtest_matches instead of inline.
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S"); rows = []
+    for test_type, test_name, pattern, params, results_json, notes, matches in tests:
+        match_count, scope = summarize_backtest(test_type, params, results_json)
+        if matches is not None and 'history' in results_json: results_json = {**results_json, 'history': None}
+        rows.append(((timestamp, test_type, test_name, pattern, json.dumps(params), encode_results(results_json), notes, match_count, scope, pattern_hash(pattern)), matches))
+    db = connect_db(); cursor = db.cursor(); test_ids = []
+    with db:
+        for row, matches in rows:
+            cursor.execute("INSERT INTO backtests (timestamp, test_type, test_name, pattern, parameters, results, notes, match_count, scope, pattern_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            test_ids.append(cursor.lastrowid)
+            if matches is not None: store_matches(db, cursor.lastrowid, matches)
+    return test_ids
+
+def save_backtest(test_type, test_name, pattern, params, results_json, notes, matches=None):
+    return save_backtests([(test_type, test_name, pattern, params, results_json, notes, matches)])[0]
+
+# BACKGROUND JOBS
+# Mind runs submitted through /api/jobs run on a pool of JOB_WORKERS threads (each of which fans out to the Mind
+# process pool). At most JOB_QUEUE_LIMIT jobs may be queued or running; further submissions are refused with 429.
+# Finished jobs are kept for polling until JOB_RETENTION newer ones have finished.
+class MindJob:
+    def __init__(self, test_name, pattern, params, notes, parsed_pattern, tickers, include_timings=False):
+        self.id = uuid.uuid4().hex; self.test_name = test_name; self.pattern = pattern; self.params = params; self.notes = notes
+        self.parsed_pattern = parsed_pattern; self.tickers = tickers; self.include_timings = include_timings
+        self.status = 'queued'; self.submitted = time.time(); self.started = None; self.finished = None
+        self.tickers_done = 0; self.total_matches = 0; self.outcome_counts = Counter()
+        self.result = None; self.message = None; self.test_id = None; self.error = None
+        self.cancel_event = threading.Event(); self.condition = threading.Condition(); self.revision = 0
+
+    def is_finished(self): return self.status in ('done', 'failed', 'cancelled')
+
+    def update(self, **changes):
+        with self.condition:
+            for k, v in changes.items(): setattr(self, k, v)
+            self.revision += 1; self.condition.notify_all()
+
+    def record_chunk(self, chunk_tickers, chunk_matches):
+        with self.condition:
+            for matches in chunk_matches:
+                ends, transitions, has_transition = outcome_codes(matches)
+                tally = tally_outcomes(*interleave_outcomes(ends, transitions, np.ones(len(matches), dtype=bool), has_transition))
+                self.outcome_counts.update({state: int(count) for state, count in tally.items()})
+                self.total_matches += len(matches)
+            self.tickers_done += len(chunk_tickers); self.revision += 1; self.condition.notify_all()
+
+    def snapshot(self, include_result=True):
+        with self.condition:
+            end = self.finished or time.time()
+            partial = [{"state": state, "probability": round((count / self.total_matches) * 100, 2)} for state, count in self.outcome_counts.most_common()] if self.total_matches else []
+            data = {'job_id': self.id, 'status': self.status, 'tickers_done': self.tickers_done, 'tickers_total': len(self.tickers),
+                    'elapsed_seconds': round(end - (self.started or end), 3), 'partial': {'total_matches': self.total_matches, 'probabilities': partial}}
+            if self.test_id is not None: data['test_id'] = self.test_id
+            if self.message: data['message'] = self.message
+            if self.error: data['error'] = self.error
+            if include_result and self.result is not None: data['result'] = self.result
+            return data, self.revision
+
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+_job_executor = None
+
+def submit_mind_job(job):
+    global _job_executor
+    with _jobs_lock:
+        active = sum(1 for j in _jobs.values() if not j.is_finished())
+        if active >= app.config['JOB_QUEUE_LIMIT']: return False
+        if _job_executor is None: _job_executor = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'], thread_name_prefix='mind-job')
+        _jobs[job.id] = job
+        finished = [job_id for job_id, j in _jobs.items() if j.is_finished()]
+        for job_id in finished[:max(0, len(finished) - app.config['JOB_RETENTION'])]: del _jobs[job_id]
+    _job_executor.submit(_run_mind_job, job)
+    return True
+
+def get_job(job_id):
+    with _jobs_lock: return _jobs.get(job_id)
+
+def _run_mind_job(job):
+    if job.cancel_event.is_set(): job.update(status='cancelled', finished=time.time()); return
+    job.update(status='running', started=time.time())
+    with collect_timings() as timings:
+        _execute_mind_job(job, timings)
+    observe_timings(timings); JOB_SECONDS.observe(job.finished - job.started, job.status)
+
+def _execute_mind_job(job, timings):
+    try:
+        per_ticker_matches, cache_stats = run_cached_analysis(job.tickers, job.params['start_date'], job.params['end_date'], job.parsed_pattern, on_chunk=job.record_chunk, cancel_event=job.cancel_event)
+        all_matches, ticker_index = concat_ticker_matches(per_ticker_matches)
+        if len(all_matches) == 0:
+            job.update(status='done', finished=time.time(), message=f"No historical matches found in the '{job.params['universe']}' universe."); return
+        results_json = process_and_package_results(all_matches, 'Mind', tickers=job.tickers, ticker_index=ticker_index, timeframe=pattern_timeframe(job.parsed_pattern))
+        results_json['test_id'] = save_backtest('Mind', job.test_name, job.pattern, job.params, results_json, job.notes)
+        results_json['cache'] = cache_stats
+        if job.include_timings: results_json['timings'] = timings.as_block(total=time.time() - job.started)
+        job.update(status='done', finished=time.time(), result=results_json, test_id=results_json['test_id'])
+    except MindRunCancelled: job.update(status='cancelled', finished=time.time())
+    except Exception as e:
+        app.logger.error(f"Job {job.id} failed: {e}", exc_info=True)
+        job.update(status='failed', finished=time.time(), error=f"An internal server error occurred: {e}")
+
 @app.route("/")
 def index(): return render_template("index.html")
 
@@ -248,42 +1586,61 @@ def favicon(): return Response(status=204)
 
 @app.route('/view/<share_uuid>')
 def view_shared_test(share_uuid):
-    db = sqlite3.connect(DATABASE); db.row_factory = sqlite3.Row; cursor = db.cursor()
-    row = cursor.execute("SELECT * FROM backtests WHERE share_uuid = ?", (share_uuid,)).fetchone(); db.close()
+    db = connect_db(); row = db.execute("SELECT * FROM backtests WHERE share_uuid = ?", (share_uuid,)).fetchone()
     if not row: return "Test not found or not shared.", 404
-    return render_template("view.html", test_data=dict(row))
+    test_data = dict(row); test_data['results'] = json.dumps(load_results(db, row['id'], row['results'], include_matches=True))
+    return render_template("view.html", test_data=test_data)
 
 @app.route('/api/get_history_by_id/<int:test_id>')
 def get_history_by_id(test_id):
-    db = sqlite3.connect(DATABASE); db.row_factory = sqlite3.Row; cursor = db.cursor()
-    row = cursor.execute("SELECT * FROM backtests WHERE id = ?", (test_id,)).fetchone(); db.close()
+    # The match list is only loaded with ?matches=1; by default just the summary is returned.
+    db = connect_db(); row = db.execute("SELECT * FROM backtests WHERE id = ?", (test_id,)).fetchone()
     if not row: return jsonify({"error": "Test not found"}), 404
     data = dict(row)
-    data['results'] = json.loads(data['results'])
+    data['results'] = load_results(db, test_id, data['results'], include_matches=bool(request.args.get('matches', 0, type=int)))
     if data.get('parameters'): data['parameters'] = json.loads(data['parameters'])
     data['results']['test_id'] = data['id']
     return jsonify(data)
 
 @app.route('/api/get_tickers')
 def get_tickers():
-    try: return jsonify(sorted([f.replace('.csv', '') for f in os.listdir(DATA_DIR) if f.endswith('.csv')]))
+    try: return jsonify(data_catalog.tickers())
     except Exception as e: return jsonify({"error": str(e)}), 500
 
 @app.route('/api/get_stock_universes')
 def get_stock_universes():
-    try:
-        if not os.path.exists(STOCK_LIST_FILE): return jsonify({'All Tickers': []})
-        df = pd.read_csv(STOCK_LIST_FILE, on_bad_lines='skip'); df.columns = [col.strip() for col in df.columns]
-        universes = {'All Tickers': []}
-        for type_name, group in df.groupby('Type'): universes[type_name.strip()] = group['Symbol'].str.strip().tolist()
-        return jsonify(universes)
+    try: return jsonify({'All Tickers': [], **data_catalog.universes()})
     except Exception as e: app.logger.error(f"Error reading stock list: {e}"); return jsonify({"error": str(e)}), 500
 
+def _fts_query(search):
+    # Every word must match as a prefix; quoting keeps FTS5 operators in user input literal.
+    return ' '.join('"' + word.replace('"', '""') + '"*' for word in search.split())
+
+def query_history(limit=50, cursor_arg='', search=''):
+    where, args = [], []
+    if cursor_arg:
+        cursor_timestamp, _, cursor_id = cursor_arg.rpartition('|')
+        if not cursor_timestamp or not cursor_id.isdigit(): raise ValueError(f"Invalid history cursor '{cursor_arg}'.")
+        where.append("(b.timestamp < ? OR (b.timestamp = ? AND b.id < ?))"); args += [cursor_timestamp, cursor_timestamp, int(cursor_id)]
+    cursor = connect_db().cursor()
+    source = "backtests b"
+    if search:
+        if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'backtests_fts'").fetchone():
+            source += " JOIN backtests_fts ON backtests_fts.rowid = b.id"; where.append("backtests_fts MATCH ?"); args.append(_fts_query(search))
+        else:
+            where.append("(b.test_name LIKE ? OR b.notes LIKE ? OR b.pattern LIKE ? OR b.scope LIKE ?)"); args += [f"%{search}%"] * 4
+    query = f"SELECT b.id, b.timestamp, b.test_type, b.test_name, b.scope, b.match_count, b.notes, b.share_uuid, b.pattern_hash FROM {source}"
+    if where: query += " WHERE " + " AND ".join(where)
+    rows = cursor.execute(query + " ORDER BY b.timestamp DESC, b.id DESC LIMIT ?", (*args, limit + 1)).fetchall()
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = f"{items[-1]['timestamp']}|{items[-1]['id']}" if len(rows) > limit else None
+    return {'items': items, 'next_cursor': next_cursor}
+
 @app.route('/api/get_history')
 def get_history_route():
-    db = sqlite3.connect(DATABASE); db.row_factory = sqlite3.Row; cursor = db.cursor()
-    rows = cursor.execute("SELECT id, timestamp, test_type, test_name, parameters, results, notes, share_uuid FROM backtests ORDER BY timestamp DESC").fetchall()
-    db.close(); return jsonify([dict(row) for row in rows])
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    try: return jsonify(query_history(limit, request.args.get('cursor', ''), request.args.get('q', '').strip()))
+    except ValueError as e: return jsonify({"error": str(e)}), 400
 
 @app.route('/api/run_backtest', methods=['POST'])
 def run_backtest_endpoint():
@@ -291,12 +1648,13 @@ def run_backtest_endpoint():
         data = request.json; test_name = data.get('test_name') or 'Untitled Single Test'
         params = {'ticker': data['ticker'], 'start_date': data['start_date'], 'end_date': data['end_date']}
         parsed_pattern = parse_advanced_pattern(data['pattern']); notes = data.get('notes', '')
-        historical_matches = run_analysis(params['ticker'], params['start_date'], params['end_date'], parsed_pattern)
-        if not historical_matches: return jsonify({"message": f"No historical instances found for {params['ticker']}."})
-        results_json = process_and_package_results(historical_matches, 'Single', params['ticker'])
-        db = sqlite3.connect(DATABASE); cursor = db.cursor()
-        cursor.execute("INSERT INTO backtests (timestamp, test_type, test_name, pattern, parameters, results, notes) VALUES (?, ?, ?, ?, ?, ?, ?)", (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 'Single', test_name, data['pattern'], json.dumps(params), json.dumps(results_json), notes))
-        results_json['test_id'] = cursor.lastrowid; db.commit(); db.close()
+        per_ticker_matches, cache_stats = run_cached_analysis([params['ticker']], params['start_date'], params['end_date'], parsed_pattern)
+        historical_matches = per_ticker_matches[0]
+        if len(historical_matches) == 0: return jsonify({"message": f"No historical instances found for {params['ticker']}."})
+        results_json = process_and_package_results(historical_matches, 'Single', params['ticker'], timeframe=pattern_timeframe(parsed_pattern))
+        results_json['test_id'] = save_backtest('Single', test_name, data['pattern'], params, results_json, notes, matches=per_ticker_matches[0])
+        results_json['cache'] = cache_stats
+        if timings_requested(data): results_json['timings'] = timings_block()
         return jsonify(results_json)
     except Exception as e: app.logger.error(f"Error: {e}", exc_info=True); return jsonify({"error": f"An internal server error occurred: {e}"}), 500
 
@@ -306,187 +1664,549 @@ def run_camarilla_mind_endpoint():
         data = request.json; test_name = data.get('test_name') or 'Untitled Mind Test'
         params = {'start_date': data['start_date'], 'end_date': data['end_date'], 'universe': data.get('universe', 'All Tickers')}
         parsed_pattern = parse_advanced_pattern(data['pattern']); notes = data.get('notes', '')
-        if params['universe'] == 'All Tickers': tickers_to_run = [f.replace('.csv', '') for f in os.listdir(DATA_DIR) if f.endswith('.csv')]
-        else: stock_df = pd.read_csv(STOCK_LIST_FILE); stock_df.columns = [col.strip() for col in stock_df.columns]; tickers_to_run = stock_df[stock_df['Type'] == params['universe']]['Symbol'].str.strip().tolist()
-        all_historical_matches = []
-        for ticker in tickers_to_run:
-            matches = run_analysis(ticker, params['start_date'], params['end_date'], parsed_pattern)
-            all_historical_matches.extend(matches)
-        if not all_historical_matches: return jsonify({"message": f"No historical matches found in the '{params['universe']}' universe."})
-        results_json = process_and_package_results(all_historical_matches, 'Mind')
-        db = sqlite3.connect(DATABASE); cursor = db.cursor()
-        cursor.execute("INSERT INTO backtests (timestamp, test_type, test_name, pattern, parameters, results, notes) VALUES (?, ?, ?, ?, ?, ?, ?)", (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 'Mind', test_name, data['pattern'], json.dumps(params), json.dumps(results_json), notes))
-        results_json['test_id'] = cursor.lastrowid; db.commit(); db.close()
+        tickers_to_run = resolve_universe(params['universe'])
+        per_ticker_matches, cache_stats = run_cached_analysis(tickers_to_run, params['start_date'], params['end_date'], parsed_pattern)
+        all_matches, ticker_index = concat_ticker_matches(per_ticker_matches)
+        if len(all_matches) == 0: return jsonify({"message": f"No historical matches found in the '{params['universe']}' universe."})
+        results_json = process_and_package_results(all_matches, 'Mind', tickers=tickers_to_run, ticker_index=ticker_index, timeframe=pattern_timeframe(parsed_pattern))
+        results_json['test_id'] = save_backtest('Mind', test_name, data['pattern'], params, results_json, notes)
+        results_json['cache'] = cache_stats
+        if timings_requested(data): results_json['timings'] = timings_block()
         return jsonify(results_json)
     except Exception as e: app.logger.error(f"Error: {e}", exc_info=True); return jsonify({"error": f"An internal server error occurred: {e}"}), 500
 
+@app.route('/api/screen_patterns', methods=['POST'])
+def screen_patterns_endpoint():
+    try:
+        data = request.json
+        params = {'start_date': data['start_date'], 'end_date': data['end_date'], 'universe': data.get('universe', 'All Tickers')}
+        patterns = [p.strip() for p in data['patterns'] if p and p.strip()]
+        if not patterns: return jsonify({"error": "Provide at least one pattern to screen."}), 400
+        parsed_patterns = []
+        for i, pattern in enumerate(patterns):
+            try: parsed_patterns.append(parse_advanced_pattern(pattern))
+            except ValueError as e: raise ValueError(f"Pattern {i + 1}: {e}")
+        unique_conditions = {(pattern_timeframe(parsed), condition_key(c)) for parsed in parsed_patterns for p in parsed for c in p['conditions']}
+        tickers_to_run = resolve_universe(params['universe'])
+        per_ticker_matches = run_mind_analysis(tickers_to_run, params['start_date'], params['end_date'], parsed_patterns, chunk_fn=_screen_ticker_chunk)
+        screened = []
+        for i, pattern in enumerate(patterns):
+            pattern_matches, ticker_index = concat_ticker_matches([ticker_matches[i] for ticker_matches in per_ticker_matches])
+            summary = process_and_package_results(pattern_matches, 'Mind', tickers=tickers_to_run, ticker_index=ticker_index, timeframe=pattern_timeframe(parsed_patterns[i]))
+            top_outcome = max(summary['probabilities']['all'], key=lambda p: p['probability']) if summary else None
+            screened.append({'pattern': pattern, 'total_matches': len(pattern_matches), 'top_outcome': top_outcome, 'results': summary})
+        screened.sort(key=lambda r: (-r['total_matches'], -(r['top_outcome']['probability'] if r['top_outcome'] else 0)))
+        for rank, row in enumerate(screened, start=1): row['rank'] = rank
+        response = {'parameters': params, 'tickers': len(tickers_to_run), 'unique_conditions': len(unique_conditions), 'patterns': screened}
+        if timings_requested(data): response['timings'] = timings_block()
+        return jsonify(response)
+    except Exception as e: app.logger.error(f"Error: {e}", exc_info=True); return jsonify({"error": f"An internal server error occurred: {e}"}), 500
+
+@app.route('/api/walk_forward', methods=['POST'])
+def walk_forward_endpoint():
+    try:
+        data = request.json
+        ticker, universe = data.get('ticker'), data.get('universe')
+        if not ticker and not universe: return jsonify({"error": "Provide a ticker or a universe to sweep."}), 400
+        # Windows are counted in periods of the pattern's timeframe; window_months/step_months are accepted for Month patterns.
+        window, step = data.get('window', data.get('window_months')), data.get('step', data.get('step_months'))
+        try: window, step = int(window), int(step)
+        except (TypeError, ValueError): return jsonify({"error": "Provide window and step as whole numbers of periods."}), 400
+        if window < 1 or step < 1: return jsonify({"error": "window and step must be at least 1."}), 400
+        parsed_pattern = parse_advanced_pattern(data['pattern']); timeframe = pattern_timeframe(parsed_pattern)
+        first_period, last_period = sweep_period_range(data['start_date'], data['end_date'], timeframe)
+        window_starts = np.arange(first_period, last_period - window + 2, step)
+        if len(window_starts) == 0: return jsonify({"error": f"The date range holds no complete {window}-{timeframe} window."}), 400
+        start_date, end_date = period_dates(first_period, int(window_starts[-1]) + window - 1, timeframe)
+        params = {'start_date': start_date, 'end_date': end_date, 'timeframe': timeframe, 'window': window, 'step': step}
+        params.update({'ticker': ticker} if ticker else {'universe': universe})
+        tickers_to_run = [ticker] if ticker else resolve_universe(universe)
+        per_ticker = run_mind_analysis(tickers_to_run, start_date, end_date, parsed_pattern, chunk_fn=_sweep_ticker_chunk)
+        results = build_sweep_results(per_ticker, tickers_to_run, window_starts, window, timeframe, by_ticker=not ticker)
+        if results is None: return jsonify({"message": f"No historical matches found for {ticker or universe}."})
+        response = {'parameters': params, **results}
+        if timings_requested(data): response['timings'] = timings_block()
+        return jsonify(response)
+    except Exception as e: app.logger.error(f"Error: {e}", exc_info=True); return jsonify({"error": f"An internal server error occurred: {e}"}), 500
+
+@app.route('/api/append_bars', methods=['POST'])
+def append_bars_endpoint():
+    try:
+        data = request.json
+        if not data.get('ticker') or not data.get('bars'): return jsonify({"error": "Provide a ticker and a list of bars."}), 400
+        return jsonify(append_daily_bars(data['ticker'], pd.DataFrame(data['bars'])))
+    except ValueError as e: return jsonify({"error": str(e)}), 400
+    except Exception as e: app.logger.error(f"Error: {e}", exc_info=True); return jsonify({"error": f"An internal server error occurred: {e}"}), 500
+
+@app.route('/api/current_setups')
+def current_setups():
+    try:
+        universe = request.args.get('universe', 'All Tickers'); tickers = resolve_universe(universe)
+        pattern_count, setups = setup_index.setups(tickers)
+        return jsonify({'universe': universe, 'tickers': len(tickers), 'patterns': pattern_count, 'setups': sorted(setups, key=lambda s: (s['ticker'], s['pattern']))})
+    except Exception as e: app.logger.error(f"Error: {e}", exc_info=True); return jsonify({"error": f"An internal server error occurred: {e}"}), 500
+
+@app.route('/api/jobs/mind', methods=['POST'])
+def submit_mind_job_endpoint():
+    try:
+        data = request.json; test_name = data.get('test_name') or 'Untitled Mind Test'
+        params = {'start_date': data['start_date'], 'end_date': data['end_date'], 'universe': data.get('universe', 'All Tickers')}
+        parsed_pattern = parse_advanced_pattern(data['pattern']); notes = data.get('notes', '')
+        job = MindJob(test_name, data['pattern'], params, notes, parsed_pattern, resolve_universe(params['universe']), include_timings=timings_requested(data))
+        if not submit_mind_job(job): return jsonify({"error": "Too many Camarilla Mind jobs are queued. Please try again shortly."}), 429
+        return jsonify(job.snapshot(include_result=False)[0]), 202
+    except Exception as e: app.logger.error(f"Error: {e}", exc_info=True); return jsonify({"error": f"An internal server error occurred: {e}"}), 500
+
+@app.route('/api/jobs/<job_id>')
+def get_job_status(job_id):
+    job = get_job(job_id)
+    if not job: return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.snapshot()[0])
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = get_job(job_id)
+    if not job: return jsonify({"error": "Job not found"}), 404
+    if not job.is_finished(): job.cancel_event.set()
+    return jsonify(job.snapshot(include_result=False)[0])
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    job = get_job(job_id)
+    if not job: return jsonify({"error": "Job not found"}), 404
+    def stream():
+        last_revision = -1
+        while True:
+            with job.condition: job.condition.wait_for(lambda: job.revision != last_revision, timeout=15)
+            finished = job.is_finished()
+            snapshot, revision = job.snapshot(include_result=finished)
+            if revision == last_revision: yield ": keep-alive\n\n"; continue
+            last_revision = revision
+            yield f"event: {snapshot['status'] if finished else 'progress'}\ndata: {json.dumps(snapshot)}\n\n"
+            if finished: return
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/share_test/<int:test_id>', methods=['POST'])
 def share_test(test_id):
-    db = sqlite3.connect(DATABASE); cursor = db.cursor()
+    db = connect_db(); cursor = db.cursor()
     cursor.execute("SELECT share_uuid FROM backtests WHERE id = ?", (test_id,)); result = cursor.fetchone()
     if result and result[0]: share_uuid = result[0]
     else: share_uuid = str(uuid.uuid4()); cursor.execute("UPDATE backtests SET share_uuid = ? WHERE id = ?", (share_uuid, test_id)); db.commit()
-    db.close(); share_url = url_for('view_shared_test', share_uuid=share_uuid, _external=True); return jsonify({"share_url": share_url})
+    share_url = url_for('view_shared_test', share_uuid=share_uuid, _external=True); return jsonify({"share_url": share_url})
 
 @app.route('/api/export_test/<int:test_id>')
 def export_test(test_id):
-    db = sqlite3.connect(DATABASE); db.row_factory = sqlite3.Row; cursor = db.cursor()
-    row = cursor.execute("SELECT * FROM backtests WHERE id = ?", (test_id,)).fetchone(); db.close()
+    # Exports keep the original .qwc layout: the table's original columns, with the match history inline.
+    db = connect_db(); row = db.execute("SELECT timestamp, test_type, test_name, pattern, parameters, results, notes FROM backtests WHERE id = ?", (test_id,)).fetchone()
     if not row: return jsonify({"error": "Test not found"}), 404
     test_data = dict(row)
     if test_data.get('parameters'): test_data['parameters'] = json.loads(test_data['parameters'])
-    if test_data.get('results'): test_data['results'] = json.loads(test_data['results'])
-    test_data.pop('id', None); test_data.pop('share_uuid', None)
+    if test_data.get('results'): test_data['results'] = load_results(db, test_id, test_data['results'], include_matches=True)
     sanitized_name = re.sub(r'[^a-zA-Z0-9_-]', '_', test_data.get('test_name', 'export'))
     filename = f"backtest_{sanitized_name}.qwc"
     return Response(json.dumps(test_data, indent=2), mimetype="application/json", headers={"Content-Disposition": f"attachment;filename={filename}"})
 
-@app.route('/api/pdf/<int:test_id>', methods=['POST'])
-def generate_pdf_from_images(test_id):
-    try:
-        data = request.json
-        bar_chart_b64 = data.get('bar_chart_img')
-        histogram_b64 = data.get('histogram_img')
+# PDF REPORTS
+# Reports are built entirely in memory from the stored results: charts are drawn with Pillow and the images are handed
+# straight to FPDF (no PNG/JPEG round trip), and nothing is written to disk. Finished PDFs are cached per test id together with a
+# fingerprint of the row, so an edited row is re-rendered while repeat downloads are served from memory (or answered
+# with 304 Not Modified through the ETag).
+CHART_TEXT_COLOR = (33, 37, 41); CHART_GRID_COLOR = (222, 226, 230)
+CHART_BAR_COLORS = {'Single': (13, 110, 253), 'Mind': (25, 135, 84)}
 
-        db = sqlite3.connect(DATABASE); db.row_factory = sqlite3.Row; cursor = db.cursor()
-        row = cursor.execute("SELECT * FROM backtests WHERE id = ?", (test_id,)).fetchone()
-        db.close()
-        if not row:
-            return jsonify({"error": "Test not found"}), 404
+def render_probability_chart(probabilities, color, scale=2):
+    """Horizontal bar chart of outcome probabilities (highest first), matching the browser chart. Returns a PIL image."""
+    probabilities = sorted(probabilities, key=lambda p: -p['probability'])
+    font = ImageFont.load_default(size=12 * scale); bold = ImageFont.load_default(size=11 * scale)
+    measure = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+    left = int(max(measure.textlength(p['state'], font=font) for p in probabilities)) + 16 * scale
+    row_h, top, right, bottom = 38 * scale, 10 * scale, 60 * scale, 50 * scale
+    width = 1000 * scale; height = top + row_h * len(probabilities) + bottom
+    plot_w = width - left - right
+    image = Image.new('RGB', (width, height), 'white'); draw = ImageDraw.Draw(image)
+    for tick in range(0, 101, 10):
+        x = left + plot_w * tick / 100
+        draw.line([(x, top), (x, height - bottom)], fill=CHART_GRID_COLOR, width=scale)
+        draw.text((x, height - bottom + 6 * scale), str(tick), fill=CHART_TEXT_COLOR, font=font, anchor='ma')
+    draw.text((left + plot_w / 2, height - 6 * scale), "Probability (%)", fill=CHART_TEXT_COLOR, font=font, anchor='md')
+    bar_h = min(25 * scale, int(row_h * 0.8))
+    for i, p in enumerate(probabilities):
+        y = top + row_h * i + row_h / 2
+        draw.text((left - 8 * scale, y), p['state'], fill=CHART_TEXT_COLOR, font=font, anchor='rm')
+        x_end = left + plot_w * min(p['probability'], 100) / 100
+        draw.rectangle([(left, y - bar_h / 2), (x_end, y + bar_h / 2)], fill=color)
+        if p['probability'] > 1: draw.text((x_end + 4 * scale, y), f"{p['probability']:.1f}%", fill=CHART_TEXT_COLOR, font=bold, anchor='lm')
+    return image
 
-        test_data = dict(row)
-        params = json.loads(test_data['parameters'])
-        results = json.loads(test_data['results'])
+def render_histogram_chart(histogram, color, scale=2):
+    """Column chart of get_histogram_data() output: how many outcomes fall in each probability band. Returns a PIL image."""
+    font = ImageFont.load_default(size=12 * scale)
+    counts, edges = histogram['counts'], histogram['bin_edges']
+    left, top, right, bottom = 50 * scale, 10 * scale, 20 * scale, 50 * scale
+    width, height = 1000 * scale, 360 * scale
+    plot_w, plot_h = width - left - right, height - top - bottom
+    y_max = max(max(counts), 1); y_step = max(1, -(-y_max // 5))
+    fill = tuple(int(255 - (255 - c) * 0.5) for c in color)
+    image = Image.new('RGB', (width, height), 'white'); draw = ImageDraw.Draw(image)
+    for tick in range(0, y_max + 1, y_step):
+        y = top + plot_h * (1 - tick / y_max)
+        draw.line([(left, y), (width - right, y)], fill=CHART_GRID_COLOR, width=scale)
+        draw.text((left - 6 * scale, y), str(tick), fill=CHART_TEXT_COLOR, font=font, anchor='rm')
+    slot = plot_w / len(counts)
+    for i, count in enumerate(counts):
+        x0 = left + slot * i
+        if count: draw.rectangle([(x0 + slot * 0.05, top + plot_h * (1 - count / y_max)), (x0 + slot * 0.95, top + plot_h)], fill=fill, outline=color, width=scale)
+        draw.text((x0 + slot / 2, top + plot_h + 6 * scale), f"{edges[i]:.0f}-{edges[i + 1]:.0f}", fill=CHART_TEXT_COLOR, font=font, anchor='ma')
+    draw.text((left + plot_w / 2, height - 6 * scale), "Outcome Probability (%)", fill=CHART_TEXT_COLOR, font=font, anchor='md')
+    return image
 
-        pdf = PDF(orientation='P', unit='mm', format='A4')
-        pdf.set_auto_page_break(auto=True, margin=15)
+def _add_chart(pdf, title, image, spacing=0):
+    img_w = pdf.w - 2 * pdf.l_margin
+    img_h = img_w * image.height / image.width
+    if pdf.get_y() + img_h > pdf.h - pdf.b_margin:
         pdf.add_page()
+    pdf.ln(spacing)
+    pdf.set_font('helvetica', 'B', 11)
+    pdf.cell(0, 8, title, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+    pdf.image(image, x=pdf.l_margin, w=img_w)
 
-        page_w = pdf.w - 2 * pdf.l_margin
-        label_w = 38
-        value_w = page_w - label_w
+@timed('pdf_render')
+def build_pdf_report(test_data, params, results):
+    pdf = PDF(orientation='P', unit='mm', format='A4')
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
 
-        # --- HEADER ---
-        pdf.set_font('helvetica', 'B', 16)
-        pdf.cell(0, 12, f"Backtest Report: {test_data['test_name']}", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
-        pdf.set_font('helvetica', '', 11)
-        if test_data['test_type'] == 'Single':
-            pdf.cell(0, 7, f"Test Type: Single | Ticker: {params.get('ticker', 'N/A')}", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
-        else:
-            pdf.cell(0, 7, f"Test Type: Mind | Universe: {params.get('universe', 'N/A')}", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
-        pdf.ln(2)
+    page_w = pdf.w - 2 * pdf.l_margin
+    label_w = 38
+    value_w = page_w - label_w
 
-        # --- PARAMETERS ---
-        pdf.set_font('helvetica', 'B', 12)
-        pdf.cell(0, 10, "Test Parameters", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        pdf.set_font('helvetica', 'B', 10)
-        pdf.cell(label_w, 6, "Pattern:")
-        pdf.set_font('helvetica', '', 10)
-        pdf.multi_cell(value_w, 6, test_data['pattern'], new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    # --- HEADER ---
+    pdf.set_font('helvetica', 'B', 16)
+    pdf.cell(0, 12, f"Backtest Report: {test_data['test_name']}", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+    pdf.set_font('helvetica', '', 11)
+    if test_data['test_type'] == 'Single':
+        pdf.cell(0, 7, f"Test Type: Single | Ticker: {params.get('ticker', 'N/A')}", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+    else:
+        pdf.cell(0, 7, f"Test Type: Mind | Universe: {params.get('universe', 'N/A')}", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+    pdf.ln(2)
+
+    # --- PARAMETERS ---
+    pdf.set_font('helvetica', 'B', 12)
+    pdf.cell(0, 10, "Test Parameters", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.set_font('helvetica', 'B', 10)
+    pdf.cell(label_w, 6, "Pattern:")
+    pdf.set_font('helvetica', '', 10)
+    pdf.multi_cell(value_w, 6, test_data['pattern'], new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.set_font('helvetica', 'B', 10)
+    pdf.cell(label_w, 6, "Date Range:")
+    pdf.set_font('helvetica', '', 10)
+    pdf.cell(value_w, 6, f"{params['start_date']} to {params['end_date']}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    if test_data.get('notes'):
         pdf.set_font('helvetica', 'B', 10)
-        pdf.cell(label_w, 6, "Date Range:")
+        pdf.cell(label_w, 6, "Notes:")
         pdf.set_font('helvetica', '', 10)
-        pdf.cell(value_w, 6, f"{params['start_date']} to {params['end_date']}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        if test_data.get('notes'):
-            pdf.set_font('helvetica', 'B', 10)
-            pdf.cell(label_w, 6, "Notes:")
-            pdf.set_font('helvetica', '', 10)
-            pdf.multi_cell(value_w, 6, test_data['notes'], new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        pdf.ln(2)
-
-        # --- PROBABILITY OUTCOME TABLE ---
+        pdf.multi_cell(value_w, 6, test_data['notes'], new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.ln(2)
+
+    # --- PROBABILITY OUTCOME TABLE ---
+    pdf.set_font('helvetica', 'B', 12)
+    pdf.cell(0, 9, "Probability Outcomes", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.set_font('helvetica', 'B', 10)
+    pdf.set_fill_color(58, 104, 184)
+    pdf.set_text_color(255)
+    pdf.cell(120, 7, "Outcome", border=1, align='L', fill=True)
+    pdf.cell(page_w - 120, 7, "Probability (%)", border=1, align='C', fill=True, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.set_font('helvetica', '', 10)
+    pdf.set_text_color(30)
+    for item in results.get('probabilities', {}).get('all', []):
+        pdf.cell(120, 7, str(item['state']), border=1)
+        pdf.cell(page_w - 120, 7, f"{item['probability']:.2f}", border=1, align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.ln(2)
+
+    # --- HISTORY TABLE (if present) ---
+    if 'history' in results and isinstance(results['history'], list) and results['history']:
         pdf.set_font('helvetica', 'B', 12)
-        pdf.cell(0, 9, "Probability Outcomes", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.cell(0, 9, "Historical Matches (up to 30 shown)", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
         pdf.set_font('helvetica', 'B', 10)
         pdf.set_fill_color(58, 104, 184)
         pdf.set_text_color(255)
-        pdf.cell(120, 7, "Outcome", border=1, align='L', fill=True)
-        pdf.cell(page_w - 120, 7, "Probability (%)", border=1, align='C', fill=True, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        date_w = 38
+        outcome_w = page_w - (date_w * 2)
+        pdf.cell(date_w, 7, "Pattern Date", border=1, align='C', fill=True)
+        pdf.cell(date_w, 7, "Outcome Date", border=1, align='C', fill=True)
+        pdf.cell(outcome_w, 7, "Outcome State(s)", border=1, align='L', fill=True, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
         pdf.set_font('helvetica', '', 10)
         pdf.set_text_color(30)
-        for item in results.get('probabilities', {}).get('all', []):
-            pdf.cell(120, 7, str(item['state']), border=1)
-            pdf.cell(page_w - 120, 7, f"{item['probability']:.2f}", border=1, align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        pdf.ln(2)
-
-        # --- HISTORY TABLE (if present) ---
-        if 'history' in results and isinstance(results['history'], list) and results['history']:
-            pdf.set_font('helvetica', 'B', 12)
-            pdf.cell(0, 9, "Historical Matches (up to 30 shown)", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-            pdf.set_font('helvetica', 'B', 10)
-            pdf.set_fill_color(58, 104, 184)
-            pdf.set_text_color(255)
-            date_w = 38
-            outcome_w = page_w - (date_w * 2)
-            pdf.cell(date_w, 7, "Pattern Date", border=1, align='C', fill=True)
-            pdf.cell(date_w, 7, "Outcome Date", border=1, align='C', fill=True)
-            pdf.cell(outcome_w, 7, "Outcome State(s)", border=1, align='L', fill=True, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-            pdf.set_font('helvetica', '', 10)
-            pdf.set_text_color(30)
-            for hist in results['history'][:30]:
-                pdf.cell(date_w, 7, str(hist['premise_date']), border=1)
-                pdf.cell(date_w, 7, str(hist['outcome_date']), border=1)
-                pdf.multi_cell(outcome_w, 7, str(hist['state']), border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        pdf.ln(2)
-
-        # --- IMAGE SECTION (Bar & Histogram) ---
-        chart_dir = os.path.join(BASE_DIR, 'static', 'charts')
-        os.makedirs(chart_dir, exist_ok=True)
-
-        # Bar chart image
-        img_path = None
-        try:
-            if bar_chart_b64:
-                img_data = base64.b64decode(bar_chart_b64.split(',')[1])
-                img = Image.open(io.BytesIO(img_data)).convert('RGB')
-                img_path = os.path.join(chart_dir, f'temp_bar_{test_id}.jpg')
-                img.save(img_path, 'JPEG')
-                img_w = pdf.w - 2 * pdf.l_margin
-                img_h = img_w * img.height / img.width
-                if pdf.get_y() + img_h > pdf.h - pdf.b_margin:
-                    pdf.add_page()
-                pdf.set_font('helvetica', 'B', 11)
-                pdf.cell(0, 8, "Probability Bar Chart", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
-                pdf.image(img_path, x=pdf.l_margin, w=img_w)
-        finally:
-            if img_path and os.path.exists(img_path):
-                os.remove(img_path)
+        for hist in results['history'][:30]:
+            pdf.cell(date_w, 7, str(hist['premise_date']), border=1)
+            pdf.cell(date_w, 7, str(hist['outcome_date']), border=1)
+            pdf.multi_cell(outcome_w, 7, str(hist['state']), border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.ln(2)
 
-        # Histogram chart image
-        hist_path = None
-        try:
-            if histogram_b64:
-                img_data = base64.b64decode(histogram_b64.split(',')[1])
-                img = Image.open(io.BytesIO(img_data)).convert('RGB')
-                hist_path = os.path.join(chart_dir, f'temp_hist_{test_id}.jpg')
-                img.save(hist_path, 'JPEG')
-                img_w = pdf.w - 2 * pdf.l_margin
-                img_h = img_w * img.height / img.width
-                if pdf.get_y() + img_h > pdf.h - pdf.b_margin:
-                    pdf.add_page()
-                pdf.ln(5)
-                pdf.set_font('helvetica', 'B', 11)
-                pdf.cell(0, 8, "Probability Distribution Histogram", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
-                pdf.image(hist_path, x=pdf.l_margin, w=img_w)
-        finally:
-            if hist_path and os.path.exists(hist_path):
-                os.remove(hist_path)
+    # --- CHARTS (Bar & Histogram) ---
+    probabilities = results.get('probabilities', {}).get('all', [])
+    color = CHART_BAR_COLORS.get(test_data['test_type'], CHART_BAR_COLORS['Single'])
+    if probabilities: _add_chart(pdf, "Probability Bar Chart", render_probability_chart(probabilities, color))
+    histogram = get_histogram_data(probabilities)
+    if histogram: _add_chart(pdf, "Probability Distribution Histogram", render_histogram_chart(histogram, color), spacing=5)
 
-        pdf.ln(7)
-        pdf.set_font('helvetica', 'I', 8)
-        pdf.set_text_color(60, 60, 80)
-        pdf.cell(0, 7, "Report generated by Quantway Consulting LLP Camarilla Backtester", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+    pdf.ln(7)
+    pdf.set_font('helvetica', 'I', 8)
+    pdf.set_text_color(60, 60, 80)
+    pdf.cell(0, 7, "Report generated by Quantway Consulting LLP Camarilla Backtester", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+    return bytes(pdf.output())
 
-        pdf_bytes = pdf.output(dest='S')
-        base64_pdf = base64.b64encode(pdf_bytes).decode('utf-8')
-        return jsonify({'pdf_data': base64_pdf})
+class ReportCache:
+    # Like BarCache, the budget (PDF_CACHE_MAX_BYTES) is read from app.config whenever a report is added.
+    def __init__(self):
+        self._entries = OrderedDict(); self._lock = threading.Lock()
+        self.current_bytes = 0; self.hits = 0; self.misses = 0; self.evictions = 0
 
+    def get(self, test_id, fingerprint, build):
+        with self._lock:
+            entry = self._entries.get(test_id)
+            if entry is not None and entry[0] == fingerprint:
+                self._entries.move_to_end(test_id); self.hits += 1
+                return entry[1]
+            self.misses += 1
+        pdf_bytes = build()
+        with self._lock:
+            stale = self._entries.pop(test_id, None)
+            if stale is not None: self.current_bytes -= len(stale[1])
+            self._entries[test_id] = (fingerprint, pdf_bytes); self.current_bytes += len(pdf_bytes)
+            while self.current_bytes > app.config['PDF_CACHE_MAX_BYTES'] and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted); self.evictions += 1
+        return pdf_bytes
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.current_bytes, 'max_bytes': app.config['PDF_CACHE_MAX_BYTES'],
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+report_cache = ReportCache()
+
+def report_fingerprint(row):
+    # Every column the report reads; a change to any of them (e.g. edited notes) yields a new fingerprint and ETag.
+    digest = hashlib.sha1()
+    for column in ('test_name', 'test_type', 'pattern', 'parameters', 'notes', 'results'):
+        value = row[column]
+        digest.update(value if isinstance(value, bytes) else str(value).encode('utf-8')); digest.update(b'\0')
+    return digest.hexdigest()
+
+@app.route('/api/pdf/<int:test_id>', methods=['GET', 'POST'])
+def generate_pdf_report(test_id):
+    try:
+        db = connect_db(); row = db.execute("SELECT id, test_name, test_type, pattern, parameters, results, notes FROM backtests WHERE id = ?", (test_id,)).fetchone()
+        if not row:
+            return jsonify({"error": "Test not found"}), 404
+        fingerprint = report_fingerprint(row)
+        def build():
+            test_data = dict(row)
+            return build_pdf_report(test_data, json.loads(test_data['parameters']), load_results(db, test_id, test_data['results'], include_matches=True))
+        pdf_bytes = report_cache.get(test_id, fingerprint, build)
+        sanitized_name = re.sub(r'[^a-zA-Z0-9_-]', '_', row['test_name'] or 'report')
+        return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf', as_attachment=True, download_name=f"backtest_report_{sanitized_name}_{test_id}.pdf",
+                         etag=fingerprint, conditional=True, max_age=0)
     except Exception as e:
         import traceback
         app.logger.error(f"PDF Generation Error: {traceback.format_exc()}")
         return jsonify({"error": f"Failed to generate PDF. Error: {e}"}), 500
 
+@app.cli.command('db-stress')
+@click.option('--writers', default=4, help='Threads saving backtests.')
+@click.option('--readers', default=4, help='Threads paging and searching history.')
+@click.option('--seconds', default=5.0, help='How long to run.')
+@click.option('--batch', default=1, help='Backtests saved per transaction.')
+def db_stress_command(writers, readers, seconds, batch):
+    """Run parallel writers and readers against a scratch database and report throughput and lock errors."""
+    global DATABASE
+    original_database = DATABASE
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as scratch_dir:
+        DATABASE = os.path.join(scratch_dir, 'stress.db'); init_db()
+        counts = Counter(); errors = Counter(); counts_lock = threading.Lock(); deadline = time.time() + seconds
+        sample = ('Mind', 'Stress Test', 'Month -1: High touched R4; Month 0: Low touched S3', {'start_date': '2015-01-01', 'end_date': '2025-01-01', 'universe': 'Nifty 50'}, {'total_historical_matches': 1}, 'stress', None)
+        def worker(action, kind):
+            while time.time() < deadline:
+                try: done = action()
+                except sqlite3.OperationalError as e:
+                    with counts_lock: errors[str(e)] += 1
+                    continue
+                with counts_lock: counts[kind] += done
+        def write(): save_backtests([sample] * batch); return batch
+        def read():
+            page = query_history(50, search='stress' if counts['reads'] % 2 else '')
+            if page['next_cursor']: query_history(50, page['next_cursor'])
+            return 1
+        threads = [threading.Thread(target=worker, args=(write, 'writes')) for _ in range(writers)] + [threading.Thread(target=worker, args=(read, 'reads')) for _ in range(readers)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        DATABASE = original_database
+    click.echo(f"{counts['writes']} backtests saved ({counts['writes'] / seconds:.0f}/s), {counts['reads']} history reads ({counts['reads'] / seconds:.0f}/s)")
+    click.echo(f"Lock errors: {sum(errors.values())}")
+    for message, count in errors.items(): click.echo(f"  {count} x {message}")
+
+# BENCHMARKS
+# `flask --app app bench generate` writes synthetic daily OHLCV histories in the data/*.csv layout, with a matching
+# StockList.csv. `bench run` times the hot paths against such a directory in a scratch workspace (the real data,
+# caches and backtests.db are untouched) and saves the timings as JSON. `bench compare` flags benchmarks whose median
+# got slower than a baseline by more than a threshold.
+BENCH_PATTERNS = ("Month -1: High touched R4 and Low above S3; Month 0: Low below S3",
+                  "Month 0: High above R1 and Low below S1",
+                  "Month -2: High touched R4; Month 0: Low touched S4")
+BENCH_START_DATE, BENCH_END_DATE = '2005-01-01', '2025-06-30'
+
+def generate_synthetic_prices(out_dir, tickers=800, years=20, seed=0, end_date=BENCH_END_DATE):
+    """Writes <out_dir>/data/SYN0000.csv ... and <out_dir>/StockList.csv, mirroring the repository layout.
+
+    Prices are geometric random walks on weekdays, with a few holidays and some tickers listing part-way through.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.join(out_dir, 'data'), exist_ok=True)
+    calendar = pd.bdate_range(end=end_date, periods=int(years * 261))
+    calendar = calendar[rng.random(len(calendar)) > 0.04]
+    symbols = [f"SYN{i:04d}" for i in range(tickers)]
+    for symbol in symbols:
+        listed = int(rng.integers(0, len(calendar) // 2)) if rng.random() < 0.2 else 0
+        dates = calendar[listed:]; n = len(dates)
+        sigma = rng.uniform(0.01, 0.03)
+        close = rng.lognormal(np.log(300), 1.2) * np.exp(np.cumsum(rng.normal(0.0003, sigma, n)))
+        open_ = np.concatenate([[close[0]], close[:-1]]) * np.exp(rng.normal(0, sigma / 3, n))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, sigma / 2, n)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, sigma / 2, n)))
+        volume = rng.lognormal(13, 1, n).astype(np.int64)
+        pd.DataFrame({'Datetime': dates.strftime('%Y-%m-%d 00:00:00+05:30'), 'open': open_.round(2), 'high': high.round(2),
+                      'low': low.round(2), 'close': close.round(2), 'Volume': volume}).to_csv(os.path.join(out_dir, 'data', f"{symbol}.csv"), index=False)
+    universes = [('Nifty 50', s) for s in symbols[:50]] + [('Nifty 500', s) for s in symbols[:500]] + [('Synthetic', s) for s in symbols]
+    pd.DataFrame(universes, columns=['Type', 'Symbol']).to_csv(os.path.join(out_dir, 'StockList.csv'), index=False)
+    return symbols
+
+def _time_samples(fn, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup: setup()
+        start = time.perf_counter(); fn(); samples.append(time.perf_counter() - start)
+    return samples
+
+def _benchmark_entry(samples, per=1, **extra):
+    # per > 1 means each sample covered that many calls; the stats are then seconds per call.
+    values = np.asarray(samples) / per
+    return {'median': float(np.median(values)), 'min': float(values.min()), 'max': float(values.max()), 'samples': len(values), 'calls': per, **extra}
+
+def run_benchmarks(data_dir, repeat=3, history_rows=5000):
+    global DATA_DIR, STOCK_LIST_FILE, PRICE_STORE_DIR, DATABASE, match_cache, bar_cache
+    saved = (DATA_DIR, STOCK_LIST_FILE, PRICE_STORE_DIR, DATABASE, match_cache, bar_cache)
+    results = {}
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as scratch_dir:
+        DATA_DIR = os.path.abspath(os.path.join(data_dir, 'data')); STOCK_LIST_FILE = os.path.abspath(os.path.join(data_dir, 'StockList.csv'))
+        PRICE_STORE_DIR = os.path.join(scratch_dir, 'prices'); DATABASE = os.path.join(scratch_dir, 'bench.db')
+        _reset_mind_pool(); init_db()
+        try:
+            tickers = resolve_universe('All Tickers'); parsed = [parse_advanced_pattern(p) for p in BENCH_PATTERNS]
+            results['parse_advanced_pattern'] = _benchmark_entry(_time_samples(lambda: [parse_advanced_pattern(p) for p in BENCH_PATTERNS * 100], repeat), per=len(BENCH_PATTERNS) * 100)
+
+            def cold_caches():
+                global bar_cache
+                shutil.rmtree(PRICE_STORE_DIR, ignore_errors=True); bar_cache = BarCache()
+            analyze_all = lambda: [run_analysis(t, BENCH_START_DATE, BENCH_END_DATE, pp) for pp in parsed for t in tickers]
+            results['run_analysis.cold'] = _benchmark_entry(_time_samples(analyze_all, repeat, setup=cold_caches), per=len(parsed) * len(tickers))
+            results['run_analysis.warm'] = _benchmark_entry(_time_samples(analyze_all, repeat), per=len(parsed) * len(tickers))
+
+            matches = concat_ticker_matches([analyze_ticker(t, BENCH_START_DATE, BENCH_END_DATE, parsed[1]) for t in tickers])
+            results['process_and_package_results'] = _benchmark_entry(
+                _time_samples(lambda: process_and_package_results(matches[0], 'Mind', tickers=tickers, ticker_index=matches[1]), repeat), matches=len(matches[0]))
+
+            client = app.test_client(); body = {'pattern': BENCH_PATTERNS[1], 'start_date': BENCH_START_DATE, 'end_date': BENCH_END_DATE, 'universe': 'All Tickers', 'test_name': 'Bench Mind'}
+            def post_mind():
+                response = client.post('/api/run_camarilla_mind', json=body)
+                if response.status_code != 200: raise click.ClickException(f"Mind endpoint failed: {response.get_json()}")
+            def cold_match_cache():
+                global match_cache
+                match_cache = MatchCache(os.path.join(scratch_dir, f"match_cache_{uuid.uuid4().hex}.db"))
+            results['api.run_camarilla_mind.cold'] = _benchmark_entry(_time_samples(post_mind, repeat, setup=cold_match_cache), tickers=len(tickers))
+            results['api.run_camarilla_mind.warm'] = _benchmark_entry(_time_samples(post_mind, repeat), tickers=len(tickers))
+
+            sample = connect_db().execute("SELECT test_type, test_name, pattern, parameters, results, notes FROM backtests ORDER BY id DESC").fetchone()
+            sample_results = decode_results(sample['results']); sample_params = json.loads(sample['parameters'])
+            rows = [('Mind', f"Bench {i} {BENCH_PATTERNS[i % len(BENCH_PATTERNS)].split(':')[1].split()[0]}", BENCH_PATTERNS[i % len(BENCH_PATTERNS)], sample_params, sample_results, f"note {i}", None)
+                    for i in range(history_rows)]
+            save_samples = _time_samples(lambda: [save_backtests(rows[i:i + 500]) for i in range(0, len(rows), 500)], 1)
+            results['save_backtests'] = _benchmark_entry(save_samples, per=len(rows))
+            def page_history(pages):
+                cursor = ''
+                for _ in range(pages):
+                    page = client.get(f"/api/get_history?limit=50&cursor={cursor}").get_json(); cursor = page['next_cursor']
+                    if not cursor: break
+            results['api.get_history.first_page'] = _benchmark_entry(_time_samples(lambda: page_history(1), repeat * 10), rows=history_rows + 2 * repeat)
+            results['api.get_history.20_pages'] = _benchmark_entry(_time_samples(lambda: page_history(20), repeat), per=20, rows=history_rows + 2 * repeat)
+            results['api.get_history.search'] = _benchmark_entry(_time_samples(lambda: client.get('/api/get_history?limit=50&q=touched'), repeat * 10), rows=history_rows + 2 * repeat)
+        finally:
+            _reset_mind_pool()
+            DATA_DIR, STOCK_LIST_FILE, PRICE_STORE_DIR, DATABASE, match_cache, bar_cache = saved
+    return results
+
+def compare_benchmarks(baseline, current, threshold):
+    """Returns (rows, regressions): rows of (name, baseline_median, current_median, ratio, status)."""
+    rows = []; regressions = 0
+    for name in sorted(set(baseline) | set(current)):
+        if name not in current: rows.append((name, baseline[name]['median'], None, None, 'missing')); continue
+        if name not in baseline: rows.append((name, None, current[name]['median'], None, 'new')); continue
+        ratio = current[name]['median'] / baseline[name]['median'] if baseline[name]['median'] else float('inf')
+        status = 'REGRESSION' if ratio > 1 + threshold else ('faster' if ratio < 1 - threshold else 'ok')
+        regressions += status == 'REGRESSION'
+        rows.append((name, baseline[name]['median'], current[name]['median'], ratio, status))
+    return rows, regressions
+
+def _print_comparison(baseline_path, current, threshold):
+    with open(baseline_path) as fh: baseline = json.load(fh)['benchmarks']
+    rows, regressions = compare_benchmarks(baseline, current, threshold)
+    fmt = lambda value: '-' if value is None else f"{value * 1000:.3f} ms"
+    for name, before, after, ratio, status in rows:
+        click.echo(f"{name:<36} {fmt(before):>14} {fmt(after):>14} {'' if ratio is None else f'{ratio:.2f}x':>7}  {status}")
+    click.echo(f"{regressions} regression(s) beyond {threshold:.0%}")
+    return regressions
+
+@app.cli.group('bench')
+def bench_group():
+    """Benchmark suite: generate synthetic data, time the hot paths, compare against a baseline."""
+
+@bench_group.command('generate')
+@click.option('--out', default='bench-data', help='Directory to write data/*.csv and StockList.csv into.')
+@click.option('--tickers', default=800, help='Number of synthetic tickers.')
+@click.option('--years', default=20, help='Years of daily bars per ticker.')
+@click.option('--seed', default=0, help='Random seed.')
+def bench_generate_command(out, tickers, years, seed):
+    """Write synthetic daily OHLCV histories in the data/*.csv format."""
+    start = time.perf_counter(); generate_synthetic_prices(out, tickers, years, seed)
+    click.echo(f"Wrote {tickers} tickers x {years} years to {out} in {time.perf_counter() - start:.1f}s")
+
+@bench_group.command('run')
+@click.option('--data', 'data_dir', default='bench-data', help='Directory holding data/*.csv and StockList.csv to benchmark against.')
+@click.option('--output', default='bench-results.json', help='Where to write the timings.')
+@click.option('--repeat', default=3, help='Samples per benchmark.')
+@click.option('--history-rows', default=5000, help='Backtests saved before timing history listing.')
+@click.option('--baseline', default=None, help='Optional earlier results file to compare against.')
+@click.option('--threshold', default=0.15, help='Slowdown (fraction of the baseline median) reported as a regression.')
+def bench_run_command(data_dir, output, repeat, history_rows, baseline, threshold):
+    """Time the hot paths against a data directory and save the results as JSON."""
+    if not os.path.isdir(data_dir): raise click.ClickException(f"{data_dir} not found; create it with `flask --app app bench generate`.")
+    benchmarks = run_benchmarks(data_dir, repeat, history_rows)
+    report = {'created': datetime.now().isoformat(timespec='seconds'), 'data_dir': os.path.abspath(data_dir),
+              'environment': {'python': sys.version.split()[0], 'numpy': np.__version__, 'pandas': pd.__version__, 'cpus': os.cpu_count(), 'mind_workers': app.config['MIND_WORKERS']},
+              'benchmarks': benchmarks}
+    with open(output, 'w') as fh: json.dump(report, fh, indent=2)
+    for name, entry in benchmarks.items(): click.echo(f"{name:<36} {entry['median'] * 1000:>12.3f} ms")
+    click.echo(f"Saved {output}")
+    if baseline and _print_comparison(baseline, benchmarks, threshold): sys.exit(1)
 
+@bench_group.command('compare')
+@click.argument('baseline')
+@click.argument('current')
+@click.option('--threshold', default=0.15, help='Slowdown (fraction of the baseline median) reported as a regression.')
+def bench_compare_command(baseline, current, threshold):
+    """Compare two results files; exits with status 1 if any benchmark regressed."""
+    with open(current) as fh: current_benchmarks = json.load(fh)['benchmarks']
+    if _print_comparison(baseline, current_benchmarks, threshold): sys.exit(1)
 
 if __name__ == '__main__':
     init_db()
@@ -126,54 +126,25 @@ document.addEventListener('DOMContentLoaded', function() {
         let testId = btn.dataset.testId;
         if (!testId && typeof testData !== 'undefined') { testId = testData.id; }
         if (!testId) { showAlert('Could not determine test ID for PDF generation.', 'danger'); return; }
-        if (!probabilityBarChart) { showAlert('Cannot generate PDF. Main chart has no data.', 'warning'); return; }
 
         btn.disabled = true; btn.innerHTML = `<span class="spinner-border spinner-border-sm"></span> Generating...`;
-        showAlert('Generating chart images for PDF...', 'info', false);
-
-        const whiteBgPlugin = {
-            id: 'customCanvasBackgroundColor',
-            beforeDraw: (chart, args, options) => {
-                const { ctx } = chart;
-                ctx.save();
-                ctx.globalCompositeOperation = 'destination-over';
-                ctx.fillStyle = options.color || '#ffffff';
-                ctx.fillRect(0, 0, chart.width, chart.height);
-                ctx.restore();
-            }
-        };
-
+        showAlert('Generating PDF report...', 'info', false);
         try {
-            Chart.register(whiteBgPlugin);
-            probabilityBarChart.options.plugins.customCanvasBackgroundColor = { color: 'white' };
-            probabilityBarChart.update();
-            const barChartImg = probabilityBarChart.toBase64Image();
-            let histogramImg = null;
-            // If your histogram is rendered by Chart.js:
-            if (typeof histogramChart !== 'undefined' && histogramChart) {
-                 histogramImg = histogramChart.toBase64Image();
-            }
-            const payload = { bar_chart_img: barChartImg,
-                              histogram_img: histogramImg // will be null if not present, that's fine
-             };
-            showAlert('Sending data to server for PDF assembly...', 'info', false);
-            const response = await fetch(`/api/pdf/${testId}`, {
-                method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(payload)
-            });
+            // The server renders the charts and caches the report, so repeat downloads are immediate.
+            const response = await fetch(`/api/pdf/${testId}`);
             if (!response.ok) { const errorData = await response.json(); throw new Error(errorData.error || `Server error: ${response.statusText}`); }
-            const data = await response.json();
-            if (data.error) throw new Error(data.error);
-            showAlert('Successfully generated PDF, download will begin.', 'success');
+            const blob = await response.blob();
+            const disposition = response.headers.get('Content-Disposition') || '';
+            const match = disposition.match(/filename="?([^";]+)"?/);
             const link = document.createElement('a');
-            link.href = `data:application/pdf;base64,${data.pdf_data}`;
-            let testName = (typeof testData !== 'undefined' ? testData.test_name : document.getElementById('test-name').value) || `report`;
-            link.download = `backtest_report_${testName.replace(/\s+/g, '_')}_${testId}.pdf`;
+            link.href = URL.createObjectURL(blob);
+            link.download = match ? match[1] : `backtest_report_${testId}.pdf`;
             link.click();
+            setTimeout(() => URL.revokeObjectURL(link.href), 1000);
+            showAlert('Successfully generated PDF, download will begin.', 'success');
         } catch (error) {
             showAlert(`PDF generation failed: ${error.message}`, 'danger', false);
         } finally {
-            Chart.unregister(whiteBgPlugin);
-            if (probabilityBarChart) { delete probabilityBarChart.options.plugins.customCanvasBackgroundColor; probabilityBarChart.update(); }
             btn.disabled = false; btn.innerHTML = `<i class="bi bi-file-earmark-pdf-fill"></i> PDF`;
         }
     }
@@ -332,13 +303,14 @@ document.addEventListener('DOMContentLoaded', function() {
     function fetchTickers() { fetch('/api/get_tickers').then(r => r.json()).then(d => { const s = document.getElementById('ticker'); if(s) d.forEach(t => s.add(new Option(t,t))); }).catch(e => showAlert(`Failed to load tickers: ${e.message}`, 'danger')); }
     function fetchStockUniverses() { fetch('/api/get_stock_universes').then(r => r.json()).then(d => { const s = document.getElementById('stock-universe'); if(s) for (const n in d) { s.add(new Option(n,n)); } }).catch(e => showAlert(`Failed to load universes: ${e.message}`, 'danger')); }
     function handleSingleBacktestSubmit(event) { event.preventDefault(); const payload = getFormParams(); payload.ticker = document.getElementById('ticker').value; handleApiCall('/api/run_backtest', payload, 'run-single-btn', (d) => showResults(d, 'Single', payload)); }
-    function handleCamarillaMindClick() { const payload = getFormParams(); payload.universe = document.getElementById('stock-universe').value; handleApiCall('/api/run_camarilla_mind', payload, 'run-mind-btn', (d) => showResults(d, 'Mind', payload)); }
+    function handleCamarillaMindClick() { const payload = getFormParams(); payload.universe = document.getElementById('stock-universe').value; handleMindJob(payload); }
+    function handleMindJob(payload) { document.getElementById('alert-container').innerHTML = ''; document.getElementById('results-placeholder')?.classList.remove('d-none'); document.getElementById('results-container')?.classList.add('d-none'); const btn = document.getElementById('run-mind-btn'); const spinner = document.getElementById(btn.dataset.spinnerId); btn.disabled = true; spinner?.classList.remove('d-none'); const finish = () => { btn.disabled = false; spinner?.classList.add('d-none'); }; fetch('/api/jobs/mind', { method: 'POST', headers: {'Content-Type': 'application/json'}, body: JSON.stringify(payload) }) .then(r => r.json().then(d => { if (!r.ok || d.error) throw new Error(d.error || `Server error: ${r.statusText}`); return d; })) .then(job => { showAlert(`Camarilla Mind queued: 0 / ${job.tickers_total} tickers.`, 'info', false); const source = new EventSource(`/api/jobs/${job.job_id}/events`); source.addEventListener('progress', (e) => { const p = JSON.parse(e.data); showAlert(`Camarilla Mind running: ${p.tickers_done} / ${p.tickers_total} tickers, ${p.partial.total_matches} match(es) so far (${p.elapsed_seconds.toFixed(1)}s).`, 'info', false); }); source.addEventListener('done', (e) => { source.close(); finish(); const p = JSON.parse(e.data); if (p.message) { showAlert(p.message, 'info'); } else { document.getElementById('alert-container').innerHTML = ''; showResults(p.result, 'Mind', payload); } }); source.addEventListener('failed', (e) => { source.close(); finish(); showAlert(JSON.parse(e.data).error, 'danger'); }); source.addEventListener('cancelled', () => { source.close(); finish(); showAlert('Camarilla Mind run was cancelled.', 'warning'); }); source.onerror = () => { if (source.readyState === EventSource.CLOSED) { finish(); showAlert('Lost connection to the Camarilla Mind job.', 'danger'); } }; }) .catch(e => { finish(); showAlert(e.message, 'danger'); }); }
     function handleFileImport(event) { const file = event.target.files[0]; if (!file) return; const reader = new FileReader(); reader.onload = (e) => { try { const data = JSON.parse(e.target.result); loadTestDataIntoUI(data); showAlert(`Successfully imported test: ${data.test_name}`, 'success'); } catch (error) { showAlert(`Import failed: Invalid file format. ${error.message}`, 'danger'); } }; reader.readAsText(file); event.target.value = ''; }
     function getFormParams() { return { test_name: document.getElementById('test-name').value.trim(), pattern: document.getElementById('pattern').value.trim(), start_date: document.getElementById('start-date').value, end_date: document.getElementById('end-date').value, notes: document.getElementById('notes').value.trim(), }; }
     function handleApiCall(endpoint, payload, buttonId, displayFunction) { document.getElementById('alert-container').innerHTML = ''; document.getElementById('results-placeholder')?.classList.remove('d-none'); document.getElementById('results-container')?.classList.add('d-none'); const btn = document.getElementById(buttonId); const spinner = document.getElementById(btn.dataset.spinnerId); btn.disabled = true; spinner?.classList.remove('d-none'); fetch(endpoint, { method: 'POST', headers: {'Content-Type': 'application/json'}, body: JSON.stringify(payload) }) .then(r => { if (!r.ok) return r.json().then(e => { throw new Error(e.error || `Server error: ${r.statusText}`) }); return r.json(); }) .then(d => { if (d.error) throw new Error(d.error); if (d.message) showAlert(d.message, 'info'); else displayFunction(d); }) .catch(e => showAlert(e.message, 'danger')) .finally(() => { btn.disabled = false; spinner?.classList.add('d-none'); }); }
     function loadTestDataIntoUI(data) { document.getElementById('test-name').value = data.test_name || ''; document.getElementById('pattern').value = data.pattern || ''; document.getElementById('notes').value = data.notes || ''; if (data.parameters) { document.getElementById('start-date').value = data.parameters.start_date || ''; document.getElementById('end-date').value = data.parameters.end_date || ''; if (data.parameters.ticker) document.getElementById('ticker').value = data.parameters.ticker; if (data.parameters.universe) document.getElementById('stock-universe').value = data.parameters.universe; } if (data.results) { showResults(data.results, data.test_type, data.parameters); } else { document.getElementById('results-placeholder')?.classList.remove('d-none'); document.getElementById('results-container')?.classList.add('d-none'); } }
-    function loadSpecificTestForView(testId) { showAlert('Loading test data...', 'info', false); fetch(`/api/get_history_by_id/${testId}`).then(r => r.json()).then(d => { if (d.error) throw new Error(d.error); loadTestDataIntoUI(d); showAlert(`Loaded results for Test ID: ${testId}`, 'success'); }).catch(e => showAlert(`Failed to load test ${testId}: ${e.message}`, 'danger')); }
-    function fetchHistory() { const tableBody = document.getElementById('history-table-body'); if (!tableBody) return; fetch('/api/get_history').then(response => response.json()).then(history => { if (history.length === 0) { tableBody.innerHTML = '<tr><td colspan="7" class="text-center">No history found.</td></tr>'; return; } let allRowsData = history; const renderTable = (data) => { tableBody.innerHTML = ''; data.forEach(item => { const results = JSON.parse(item.results); const params = item.parameters ? JSON.parse(item.parameters) : {}; const matchCount = results.total_matches || results.total_historical_matches || 0; let tickerOrUniverse = (item.test_type === 'Single') ? (params.ticker || 'N/A') : (params.universe || 'All Tickers'); const notes = item.notes || ''; const notesDisplay = notes.length > 30 ? `<span title="${notes}">${notes.substring(0, 30)}...</span>` : (notes || '—'); const row = document.createElement('tr'); row.innerHTML = ` <td><a href="/?view_test_id=${item.id}" class="text-decoration-none">${item.test_name}</a></td> <td><span class="badge ${item.test_type === 'Single' ? 'bg-primary-custom' : 'bg-success-custom'}">${item.test_type}</span></td> <td>${tickerOrUniverse}</td><td>${new Date(item.timestamp).toLocaleString()}</td><td>${matchCount}</td><td>${notesDisplay}</td> <td> <div class="btn-group"><a href="/?view_test_id=${item.id}" class="btn btn-sm btn-outline-primary-custom" title="View/Reload"><i class="bi bi-eye-fill"></i></a> <button class="btn btn-sm btn-outline-primary-custom share-btn" title="Share" data-id="${item.id}" data-uuid="${item.share_uuid || ''}"><i class="bi bi-share-fill"></i></button> <a href="/api/export_test/${item.id}" class="btn btn-sm btn-outline-primary-custom" title="Export"><i class="bi bi-download"></i></a></div> </td>`; tableBody.appendChild(row); }); }; const filterRows = () => { const searchTerm = document.getElementById('history-search').value.toLowerCase(); if (!searchTerm) { renderTable(allRowsData); return; } const filteredData = allRowsData.filter(item => { const params = item.parameters ? JSON.parse(item.parameters) : {}; let tickerOrUniverse = (item.test_type === 'Single') ? (params.ticker || '') : (params.universe || ''); return (item.test_name.toLowerCase().includes(searchTerm) || tickerOrUniverse.toLowerCase().includes(searchTerm) || (item.notes && item.notes.toLowerCase().includes(searchTerm))); }); renderTable(filteredData); }; renderTable(allRowsData); document.getElementById('history-search')?.addEventListener('input', filterRows); tableBody.addEventListener('click', handleShareClick); }).catch(error => { console.error('Failed to load history:', error); tableBody.innerHTML = `<tr><td colspan="7" class="text-center text-danger">Failed to load history: ${error.message}</td></tr>`; }); }
+    function loadSpecificTestForView(testId) { showAlert('Loading test data...', 'info', false); fetch(`/api/get_history_by_id/${testId}?matches=1`).then(r => r.json()).then(d => { if (d.error) throw new Error(d.error); loadTestDataIntoUI(d); showAlert(`Loaded results for Test ID: ${testId}`, 'success'); }).catch(e => showAlert(`Failed to load test ${testId}: ${e.message}`, 'danger')); }
+    function fetchHistory() { const tableBody = document.getElementById('history-table-body'); if (!tableBody) return; const loadMoreBtn = document.getElementById('history-load-more'); let nextCursor = null; let searchTerm = ''; let requestSeq = 0; const renderRows = (items) => { items.forEach(item => { const notes = item.notes || ''; const notesDisplay = notes.length > 30 ? `<span title="${notes}">${notes.substring(0, 30)}...</span>` : (notes || '—'); const row = document.createElement('tr'); row.innerHTML = ` <td><a href="/?view_test_id=${item.id}" class="text-decoration-none">${item.test_name}</a></td> <td><span class="badge ${item.test_type === 'Single' ? 'bg-primary-custom' : 'bg-success-custom'}">${item.test_type}</span></td> <td>${item.scope || 'N/A'}</td><td>${new Date(item.timestamp).toLocaleString()}</td><td>${item.match_count || 0}</td><td>${notesDisplay}</td> <td> <div class="btn-group"><a href="/?view_test_id=${item.id}" class="btn btn-sm btn-outline-primary-custom" title="View/Reload"><i class="bi bi-eye-fill"></i></a> <button class="btn btn-sm btn-outline-primary-custom share-btn" title="Share" data-id="${item.id}" data-uuid="${item.share_uuid || ''}"><i class="bi bi-share-fill"></i></button> <a href="/api/export_test/${item.id}" class="btn btn-sm btn-outline-primary-custom" title="Export"><i class="bi bi-download"></i></a></div> </td>`; tableBody.appendChild(row); }); }; const loadPage = (reset) => { const seq = ++requestSeq; const params = new URLSearchParams({ limit: 50 }); if (searchTerm) params.set('q', searchTerm); if (!reset && nextCursor) params.set('cursor', nextCursor); if (loadMoreBtn) loadMoreBtn.disabled = true; fetch(`/api/get_history?${params}`).then(response => response.json()).then(page => { if (seq !== requestSeq) return; if (page.error) throw new Error(page.error); if (reset) tableBody.innerHTML = ''; if (reset && page.items.length === 0) { tableBody.innerHTML = `<tr><td colspan="7" class="text-center">${searchTerm ? 'No matching tests.' : 'No history found.'}</td></tr>`; } renderRows(page.items); nextCursor = page.next_cursor; if (loadMoreBtn) { loadMoreBtn.classList.toggle('d-none', !nextCursor); loadMoreBtn.disabled = false; } }).catch(error => { console.error('Failed to load history:', error); tableBody.innerHTML = `<tr><td colspan="7" class="text-center text-danger">Failed to load history: ${error.message}</td></tr>`; }); }; let searchTimer = null; document.getElementById('history-search')?.addEventListener('input', (e) => { clearTimeout(searchTimer); searchTimer = setTimeout(() => { searchTerm = e.target.value.trim(); nextCursor = null; loadPage(true); }, 250); }); loadMoreBtn?.addEventListener('click', () => loadPage(false)); tableBody.addEventListener('click', handleShareClick); loadPage(true); }
     async function handleShareClick (e) { const btn = e.target.closest('.share-btn'); if (!btn) return; const shareModal = new bootstrap.Modal(document.getElementById('shareModal')); const shareLinkInput = document.getElementById('shareLinkInput'); const testId = btn.dataset.id; const existingUuid = btn.dataset.uuid; btn.disabled = true; const originalIcon = btn.innerHTML; btn.innerHTML = `<span class="spinner-border spinner-border-sm"></span>`; try { let shareUrl; if (existingUuid) { const url = new URL(window.location.href); shareUrl = `${url.protocol}//${url.host}/view/${existingUuid}`; } else { const response = await fetch(`/api/share_test/${testId}`, { method: 'POST' }); const data = await response.json(); if (data.share_url) { shareUrl = data.share_url; btn.dataset.uuid = data.share_url.split('/').pop(); } else { throw new Error("Could not generate share link."); } } shareLinkInput.value = shareUrl; shareModal.show(); } catch (error) { console.error('Sharing failed:', error); showAlert(error.message, 'danger'); } finally { btn.disabled = false; btn.innerHTML = originalIcon; } };
     
     initializeApp();
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+
+@pytest.fixture(autouse=True, scope='session')
+def scratch_database(tmp_path_factory):
+    """Points app.DATABASE at a temporary file so the suite never touches the tracked backtests.db."""
+    original = app.DATABASE
+    app.DATABASE = str(tmp_path_factory.mktemp('db') / 'backtests.db')
+    app.init_db()
+    yield app.DATABASE
+    app.DATABASE = original
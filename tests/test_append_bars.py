@@ -0,0 +1,53 @@
+"""Appending daily bars in batches must leave the price store and cached bars exactly as a full rebuild would."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+TICKERS = sorted(f[:-4] for f in os.listdir(app.DATA_DIR) if f.endswith('.csv'))[:4]
+APPENDED_ROWS = 300
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """Copies of a few tickers cut APPENDED_ROWS rows short, with their own price store; returns the full CSVs."""
+    os.makedirs(tmp_path / 'data'); full = {}
+    for ticker in TICKERS:
+        full[ticker] = pd.read_csv(os.path.join(app.DATA_DIR, f"{ticker}.csv"))
+        full[ticker].iloc[:-APPENDED_ROWS].to_csv(tmp_path / 'data' / f"{ticker}.csv", index=False)
+    monkeypatch.setattr(app, 'DATA_DIR', str(tmp_path / 'data'))
+    monkeypatch.setattr(app, 'PRICE_STORE_DIR', str(tmp_path / 'prices'))
+    monkeypatch.setattr(app, 'bar_cache', app.BarCache())
+    return tmp_path, full
+
+
+def assert_same_arrays(got, expected, what):
+    assert set(got) == set(expected), what
+    for key in expected:
+        assert got[key].dtype == expected[key].dtype and np.array_equal(got[key], expected[key], equal_nan=True), (what, key)
+
+
+@pytest.mark.parametrize('ticker', TICKERS)
+def test_batched_appends_match_full_rebuild(workspace, monkeypatch, ticker):
+    tmp_path, full = workspace
+    rng = np.random.default_rng(sum(map(ord, ticker)))
+    app.bar_cache.get(ticker, app.load_price_data(ticker), app.TIMEFRAMES)
+    rest, pos = full[ticker].iloc[-APPENDED_ROWS:], 0
+    while pos < len(rest):
+        size = int(rng.integers(1, 30))
+        app.append_daily_bars(ticker, rest.iloc[pos:pos + size].copy()); pos += size
+
+    appended = app.load_price_data(ticker)
+    misses = app.bar_cache.misses
+    cached = app.bar_cache.get(ticker, appended, app.TIMEFRAMES)
+    assert app.bar_cache.misses == misses, "appends should extend the cached bars, not drop them"
+
+    monkeypatch.setattr(app, 'PRICE_STORE_DIR', str(tmp_path / 'fresh_prices'))
+    rebuilt = app.load_price_data(ticker)
+    assert rebuilt['version'] == appended['version'] and len(rebuilt['days']) == len(full[ticker])
+    assert_same_arrays({k: appended[k] for k in ('days',) + app.PRICE_COLUMNS}, {k: rebuilt[k] for k in ('days',) + app.PRICE_COLUMNS}, 'price store')
+    expected = app.build_period_bars(rebuilt, app.TIMEFRAMES)
+    for timeframe in app.TIMEFRAMES: assert_same_arrays(cached[timeframe], expected[timeframe], timeframe)
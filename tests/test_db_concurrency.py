@@ -0,0 +1,40 @@
+"""Parallel save_backtests writers and query_history readers against one database must never hit "database is locked"."""
+import sqlite3
+import threading
+
+import app
+
+WRITERS, READERS, SAVES_PER_WRITER, BATCH = 4, 4, 25, 2
+SAMPLE = ('Mind', 'Stress Test', 'Month -1: High touched R4; Month 0: Low touched S3',
+          {'start_date': '2015-01-01', 'end_date': '2025-01-01', 'universe': 'Nifty 50'}, {'total_historical_matches': 1}, 'stress', None)
+
+
+def test_parallel_saves_and_history_reads(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'DATABASE', str(tmp_path / 'stress.db'))
+    app.init_db()
+    errors, reads = [], []; writers_done = threading.Event()
+
+    def write():
+        for _ in range(SAVES_PER_WRITER):
+            try: app.save_backtests([SAMPLE] * BATCH)
+            except sqlite3.OperationalError as e: errors.append(e)
+
+    def read():
+        while not writers_done.is_set():
+            try:
+                page = app.query_history(50, search='stress' if len(reads) % 2 else '')
+                if page['next_cursor']: app.query_history(50, page['next_cursor'])
+            except sqlite3.OperationalError as e: errors.append(e)
+            reads.append(1)
+
+    writer_threads = [threading.Thread(target=write) for _ in range(WRITERS)]
+    reader_threads = [threading.Thread(target=read) for _ in range(READERS)]
+    for t in writer_threads + reader_threads: t.start()
+    for t in writer_threads: t.join()
+    writers_done.set()
+    for t in reader_threads: t.join()
+
+    assert errors == []
+    assert reads
+    saved = app.connect_db().execute("SELECT COUNT(*) FROM backtests WHERE test_name = 'Stress Test'").fetchone()[0]
+    assert saved == WRITERS * SAVES_PER_WRITER * BATCH
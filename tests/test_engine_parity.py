@@ -0,0 +1,230 @@
+"""Differential test: the vectorized engine must reproduce the original pandas engine for every ticker in data/.
+
+reference_run_analysis is the pre-optimization run_analysis (CSV -> resample('MS') -> row-by-row iloc matching), and
+reference_process_and_package_results the pre-optimization summary built from its output (pandas value_counts), both
+kept verbatim apart from reading their inputs from the app module.
+"""
+import functools
+import os
+import sys
+import itertools
+from collections import defaultdict
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+PATTERNS = [
+    "Month -1: High touched R4 and Low above S3; Month 0: Low below S3",
+    "Month 0: High touched R3",
+    "Month 0: Low touched S3",
+    "Month 0: High above R1 and Low below S1",
+    "Month -2: High touched R4; Month 0: Low touched S4",
+    "Month -1: High below P; Month 0: High above P",
+    "Month 0: Low above R5",
+    "Month -3: Low touched S2; Month -1: High touched R2; Month 0: High above P",
+    "Month 0: high TOUCHED r2 and low touched s2",
+    "Month 2: High touched R1",
+    "Month -1: Low below S1; Month 1: High above R1",
+]
+DATE_RANGES = [("1990-01-01", "2030-01-01"), ("2015-08-15", "2025-08-15"), ("2010-01-01", "2012-12-31"),
+               ("2008-03-17", "2009-06-05"), ("2020-01-31", "2020-06-01"), ("2024-01-01", "2024-03-01")]
+TICKERS = sorted(f[:-4] for f in os.listdir(app.DATA_DIR) if f.endswith('.csv'))
+
+
+def reference_calculate_camarilla(df):
+    pivots = {}; p = (df['high'] + df['low'] + df['close']) / 3; pivots['P'] = p; range_val = df['high'] - df['low']
+    pivots['R1'] = df['close'] + 1.1 * range_val / 12; pivots['S1'] = df['close'] - 1.1 * range_val / 12; pivots['R2'] = df['close'] + 1.1 * range_val / 6; pivots['S2'] = df['close'] - 1.1 * range_val / 6; pivots['R3'] = df['close'] + 1.1 * range_val / 4; pivots['S3'] = df['close'] - 1.1 * range_val / 4; pivots['R4'] = df['close'] + 1.1 * range_val / 2; pivots['S4'] = df['close'] - 1.1 * range_val / 2; pivots['R5'] = (df['high'] / df['low']) * df['close'] if df['low'] > 0 else df['close']; pivots['S5'] = df['close'] - (pivots['R5'] - df['close'])
+    return pd.Series(pivots)
+
+
+def reference_evaluate_condition(row, condition):
+    price = row[condition['price_point']]; pivot_value = row[condition['pivot']]; op = condition['operator']
+    if pd.isna(pivot_value): return False
+    if op == 'touched': return price >= pivot_value if condition['price_point'] == 'high' else price <= pivot_value
+    elif op == 'above': return price > pivot_value
+    elif op == 'below': return price < pivot_value
+    return False
+
+
+def reference_get_zone_name(price, pivots):
+    p = pivots
+    if not p or not isinstance(p, dict): return "Invalid Pivots"
+    levels = sorted([(k, v) for k, v in p.items() if k.startswith(('R', 'S', 'P')) and pd.notna(v)], key=lambda item: item[1], reverse=True)
+    if not levels: return "No Pivots"
+    if price > levels[0][1]: return f"Above {levels[0][0]}"
+    for i in range(len(levels) - 1):
+        if levels[i+1][1] < price <= levels[i][1]:
+            return f"{levels[i+1][0]}-{levels[i][0]} Zone"
+    if price <= levels[-1][1]: return f"Below {levels[-1][0]}"
+    return "Unknown Zone"
+
+
+def reference_get_detailed_outcome(daily_df_outcome, pivots):
+    if daily_df_outcome.empty: return []
+    first_week_df = daily_df_outcome.head(5)
+    last_week_df = daily_df_outcome.tail(5)
+    if first_week_df.empty or last_week_df.empty: return []
+    start_zone = reference_get_zone_name(first_week_df['close'].mean(), pivots)
+    end_zone = reference_get_zone_name(last_week_df['close'].mean(), pivots)
+    outcomes = {f"Ends in {end_zone}"}
+    if "Unknown" not in start_zone and "Unknown" not in end_zone and "Invalid" not in start_zone:
+        if start_zone != end_zone: outcomes.add(f"{start_zone} -> {end_zone}")
+        else: outcomes.add(f"Stays in {start_zone}")
+    return list(outcomes)
+
+
+def reference_run_analysis(ticker, start_date, end_date, parsed_pattern):
+    file_path = os.path.join(app.DATA_DIR, f"{ticker}.csv")
+    if not os.path.exists(file_path): return []
+    df = pd.read_csv(file_path, on_bad_lines='skip'); df.columns = [col.lower() for col in df.columns]
+    df['datetime'] = pd.to_datetime(df['datetime'], utc=True, errors='coerce').dt.tz_convert('Asia/Kolkata')
+    df.dropna(subset=['datetime'], inplace=True); df.set_index('datetime', inplace=True)
+    df_filtered = df.loc[pd.Timestamp(start_date, tz='Asia/Kolkata'):pd.Timestamp(end_date, tz='Asia/Kolkata')]
+    if df_filtered.empty: return []
+    monthly_df = df_filtered.resample('MS').agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last'}).dropna()
+    if len(monthly_df) < 2: return []
+    pivots_df = monthly_df.shift(1).apply(reference_calculate_camarilla, axis=1)
+    combined_df = monthly_df.join(pivots_df.add_prefix('p_'))
+    matches = []
+    max_offset = max(p['offset'] for p in parsed_pattern) if parsed_pattern else 0
+    min_offset = min(p['offset'] for p in parsed_pattern) if parsed_pattern else 0
+    start_index = -min_offset if min_offset < 0 else 0
+    end_index = len(combined_df) - (max_offset + 1)
+    for i in range(start_index, end_index):
+        pattern_match_found = True
+        for p in parsed_pattern:
+            offset_index = i + p['offset']
+            if not (0 <= offset_index < len(combined_df)):
+                pattern_match_found = False; break
+            row = combined_df.iloc[offset_index]
+            context_for_eval = {'high': row['high'], 'low': row['low'], **{level: row[f'p_{level}'] for level in app.PIVOT_LEVELS}}
+            if not all(reference_evaluate_condition(context_for_eval, c) for c in p['conditions']):
+                pattern_match_found = False; break
+        if pattern_match_found:
+            outcome_index = i + max_offset + 1
+            if outcome_index < len(combined_df):
+                outcome_month_start = combined_df.index[outcome_index]
+                daily_df_outcome = df_filtered.loc[outcome_month_start:outcome_month_start + pd.offsets.MonthEnd(0)]
+                if daily_df_outcome.empty: continue
+                pivots_renamed = {k.replace('p_', ''): v for k, v in combined_df.iloc[outcome_index - 1].to_dict().items() if k.startswith('p_')}
+                outcomes = reference_get_detailed_outcome(daily_df_outcome, pivots_renamed)
+                if not outcomes: continue
+                matches.append({"premise_date": combined_df.index[i + max_offset].strftime('%Y-%m-%d'), "outcome_date": outcome_month_start.strftime('%Y-%m-%d'), "outcomes": outcomes})
+    return matches
+
+
+def reference_process_and_package_results(historical_matches, test_type, ticker=None):
+    if not historical_matches: return None
+    
+    # --- Overall Probabilities ---
+    all_outcomes_flat = [outcome for match in historical_matches for outcome in match['outcomes']]
+    total_matches_all = len(historical_matches)
+    counts_all = pd.Series(all_outcomes_flat).value_counts()
+    probs_all = [{"state": state, "probability": round((count / total_matches_all) * 100, 2)} for state, count in counts_all.items()] if total_matches_all > 0 else []
+    
+    # --- Singular Probabilities ---
+    singular_matches = [m['outcomes'] for m in historical_matches if not any('->' in o for o in m['outcomes'])]
+    total_matches_singular = len(singular_matches)
+    singular_outcomes_flat = [o for sublist in singular_matches for o in sublist]
+    probs_singular = []
+    if singular_outcomes_flat and total_matches_singular > 0:
+        counts_singular = pd.Series(singular_outcomes_flat).value_counts()
+        probs_singular = [{"state": state, "probability": round((count / total_matches_singular) * 100, 2)} for state, count in counts_singular.items()]
+    
+    # --- Path Probabilities ---
+    path_matches = [m['outcomes'] for m in historical_matches if any('->' in o for o in m['outcomes'])]
+    total_matches_path = len(path_matches)
+    path_outcomes_flat = [o for sublist in path_matches for o in sublist if '->' in o]
+    probs_path = []
+    if path_outcomes_flat and total_matches_path > 0:
+        counts_path = pd.Series(path_outcomes_flat).value_counts()
+        probs_path = [{"state": state, "probability": round((count / total_matches_path) * 100, 2)} for state, count in counts_path.items()]
+    
+    # --- NEW: Conditional Probabilities by Starting Zone ---
+    probs_by_start_zone = defaultdict(lambda: defaultdict(int))
+    total_by_start_zone = defaultdict(int)
+    for match in path_matches:
+        for outcome in match:
+            if '->' in outcome:
+                start_zone, end_zone = [p.strip() for p in outcome.split('->')]
+                probs_by_start_zone[start_zone][end_zone] += 1
+                total_by_start_zone[start_zone] += 1
+    
+    final_probs_by_start_zone = {}
+    for start_zone, end_zones in probs_by_start_zone.items():
+        total = total_by_start_zone[start_zone]
+        final_probs_by_start_zone[start_zone] = [
+            {"state": end_zone, "probability": round((count / total) * 100, 2)}
+            for end_zone, count in end_zones.items()
+        ]
+
+    # --- Package all results ---
+    results_json = {
+        "probabilities": {
+            "all": probs_all,
+            "singular": probs_singular,
+            "path": probs_path
+        },
+        "probabilities_by_start_zone": final_probs_by_start_zone, # Add new data
+        "totals": {
+            "all": total_matches_all,
+            "singular": total_matches_singular,
+            "path": total_matches_path
+        }
+    }
+    
+    if test_type == 'Single':
+        results_json["total_matches"] = total_matches_all
+        history_for_json = [{"premise_date": m["premise_date"], "outcome_date": m["outcome_date"], "state": ", ".join(sorted(m['outcomes'], key=lambda x: ('->' in x, x)))} for m in historical_matches]
+        results_json["history"] = history_for_json
+        results_json["ticker"] = ticker
+    else:
+        results_json["total_historical_matches"] = total_matches_all
+        
+    return results_json
+
+
+@functools.lru_cache(maxsize=None)
+def reference_matches(ticker, pattern, start_date, end_date):
+    return reference_run_analysis(ticker, start_date, end_date, app.parse_advanced_pattern(pattern))
+
+
+def normalized(matches):
+    # The reference builds outcomes from a set, so their order is arbitrary.
+    return [dict(m, outcomes=sorted(m['outcomes'])) for m in matches]
+
+
+def normalized_summary(results):
+    # Outcomes tied on probability are listed in an order that depends on the reference's set iteration, so sort them.
+    if results is None: return None
+    by_probability = lambda probs: sorted(probs, key=lambda p: (-p['probability'], p['state']))
+    return dict(results, probabilities={k: by_probability(v) for k, v in results['probabilities'].items()},
+                probabilities_by_start_zone={k: by_probability(v) for k, v in results['probabilities_by_start_zone'].items()})
+
+
+@pytest.mark.parametrize('ticker', TICKERS)
+def test_run_analysis_matches_reference_engine(ticker):
+    for pattern, (start_date, end_date) in itertools.product(PATTERNS, DATE_RANGES):
+        parsed_pattern = app.parse_advanced_pattern(pattern)
+        expected = normalized(reference_matches(ticker, pattern, start_date, end_date))
+        assert normalized(app.run_analysis(ticker, start_date, end_date, parsed_pattern)) == expected, (ticker, pattern, start_date, end_date)
+
+
+@pytest.mark.parametrize('ticker', TICKERS)
+def test_single_results_match_reference_packaging(ticker):
+    for pattern, (start_date, end_date) in itertools.product(PATTERNS, DATE_RANGES):
+        expected = reference_process_and_package_results(reference_matches(ticker, pattern, start_date, end_date), 'Single', ticker)
+        matches = app.analyze_ticker(ticker, start_date, end_date, app.parse_advanced_pattern(pattern))
+        assert normalized_summary(app.process_and_package_results(matches, 'Single', ticker)) == normalized_summary(expected), (ticker, pattern, start_date, end_date)
+
+
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_mind_results_match_reference_packaging(pattern):
+    parsed_pattern = app.parse_advanced_pattern(pattern)
+    for start_date, end_date in DATE_RANGES:
+        expected = reference_process_and_package_results([m for t in TICKERS for m in reference_matches(t, pattern, start_date, end_date)], 'Mind')
+        matches, _ = app.concat_ticker_matches([app.analyze_ticker(t, start_date, end_date, parsed_pattern) for t in TICKERS])
+        assert normalized_summary(app.process_and_package_results(matches, 'Mind')) == normalized_summary(expected), (pattern, start_date, end_date)
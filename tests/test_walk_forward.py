@@ -0,0 +1,57 @@
+"""Walk-forward sweeps must give every window the results a separate run over that window's dates would give."""
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import app
+
+SWEEPS = [
+    ("Month -1: High touched R4 and Low above S3; Month 0: Low below S3", 12, 1),
+    ("Month -3: Low touched S2; Month -1: High touched R2; Month 0: High above P", 7, 3),
+    ("Month 2: High touched R1", 2, 1),
+    ("Month -1: Low below S1; Month 1: High above R1", 5, 2),
+    ("Week -1: High touched R2; Week 0: Low touched S1", 26, 4),
+    ("Quarter 0: High above R1", 4, 1),
+]
+START_DATE, END_DATE = '2012-01-01', '2022-12-31'
+GAP_MONTHS = ['2014-03', '2014-04', '2017-11', '2020-06']
+
+
+@pytest.fixture(params=['data', 'gaps'])
+def tickers(request, tmp_path, monkeypatch):
+    """The tickers in data/, or a copy of a few of them with whole months missing."""
+    monkeypatch.setitem(app.app.config, 'MIND_WORKERS', 1)
+    if request.param == 'gaps':
+        os.makedirs(tmp_path / 'data')
+        for name in sorted(os.listdir(app.DATA_DIR))[:3]:
+            df = pd.read_csv(os.path.join(app.DATA_DIR, name))
+            df[~df.iloc[:, 0].astype(str).str[:7].isin(GAP_MONTHS)].to_csv(tmp_path / 'data' / name, index=False)
+        monkeypatch.setattr(app, 'DATA_DIR', str(tmp_path / 'data'))
+        monkeypatch.setattr(app, 'PRICE_STORE_DIR', str(tmp_path / 'prices'))
+        yield app.resolve_universe('All Tickers')
+        shutil.rmtree(tmp_path / 'prices', ignore_errors=True)
+    else:
+        yield app.resolve_universe('All Tickers')
+
+
+def probabilities(entries):
+    # Outcomes tied on count may be listed in a different order, so compare them sorted.
+    return sorted((p['state'], p['probability']) for p in entries)
+
+
+@pytest.mark.parametrize('pattern, window, step', SWEEPS)
+def test_windows_match_separate_runs(tickers, pattern, window, step):
+    client = app.app.test_client(); parsed_pattern = app.parse_advanced_pattern(pattern)
+    scopes = [({'ticker': ticker}, [ticker]) for ticker in tickers] + [({'universe': 'All Tickers'}, tickers)]
+    for scope, scope_tickers in scopes:
+        response = client.post('/api/walk_forward', json={'pattern': pattern, 'start_date': START_DATE, 'end_date': END_DATE, 'window': window, 'step': step, **scope})
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        if 'windows' not in body: continue
+        for w in body['windows']:
+            matches, _ = app.concat_ticker_matches([app.analyze_ticker(t, w['start_date'], w['end_date'], parsed_pattern) for t in scope_tickers])
+            expected = app.process_and_package_results(matches, 'Mind', timeframe=app.pattern_timeframe(parsed_pattern))
+            assert w['total_matches'] == len(matches), (scope, w['start_date'])
+            assert probabilities(w['probabilities']) == (probabilities(expected['probabilities']['all']) if expected else []), (scope, w['start_date'])